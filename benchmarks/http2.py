@@ -0,0 +1,104 @@
+"""HTTP/1.1 versus HTTP/2 request throughput against the Bookstore example.
+
+The Bookstore app in project/ is served by hypercorn, which speaks both
+HTTP/1.1 and HTTP/2. For each protocol and concurrency level the same
+number of requests is sent through the client the CLI uses, reporting the
+time taken and the number of connections opened. Results are JSON lines:
+
+    python benchmarks/http2.py --requests 1000 --concurrency 1 10 100
+
+Requires hypercorn and the h2 package, i.e. httpx[http2], plus the
+dependencies of the Bookstore app.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from spec_cache import load_cli_module
+
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "project")
+
+
+def start_server(port):
+    server = subprocess.Popen(
+        [sys.executable, "-m", "hypercorn", "main:app", "--bind", f"127.0.0.1:{port}"],
+        cwd=PROJECT_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    import httpx
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/books/")
+            return server
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("hypercorn did not start, is it installed?")
+
+
+def run(openapi_cli, profile, requests, concurrency):
+    connections = []
+
+    def trace(event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            connections.append(event_name)
+
+    client = openapi_cli.make_client(profile)
+    url = profile["base_url"] + "/books/"
+
+    def send(_):
+        return client.get(url, extensions={"trace": trace}).http_version
+
+    with client, ThreadPoolExecutor(concurrency) as executor:
+        start = time.perf_counter()
+        versions = set(executor.map(send, range(requests)))
+        seconds = time.perf_counter() - start
+
+    return {
+        "protocol": ", ".join(sorted(versions)),
+        "concurrency": concurrency,
+        "requests": requests,
+        "seconds": seconds,
+        "requests_per_second": requests / seconds,
+        "connections": len(connections),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1_000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", type=argparse.FileType("w"), default=sys.stdout)
+    args = parser.parse_args()
+
+    openapi_cli = load_cli_module()
+    server = start_server(args.port)
+    try:
+        for http2 in (False, True):
+            for concurrency in args.concurrency:
+                profile = dict(
+                    openapi_cli.DEFAULT_PROFILE,
+                    name="benchmark",
+                    base_url=f"http://127.0.0.1:{args.port}",
+                    http2=http2,
+                    # Served over plain http, which HTTP/2 needs prior knowledge for
+                    http2_prior_knowledge=http2,
+                    max_connections=concurrency,
+                    max_keepalive_connections=concurrency,
+                )
+                result = run(openapi_cli, profile, args.requests, concurrency)
+                print(json.dumps(result), file=args.output, flush=True)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Size and load time of cached specs, per cache compression format.
+
+For each format in SPEC_COMPRESSIONS this reports the compressed size, the
+time to compress, and the time to read, decompress and parse the cached spec
+compared to parsing the raw spec. Results are JSON lines:
+
+    python benchmarks/spec_cache.py --operations 10000
+"""
+import argparse
+import importlib
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+
+from startup import SCRIPT_PATH
+from startup import generate_spec
+
+
+def load_cli_module():
+    module_spec = importlib.util.spec_from_file_location("openapi_cli", SCRIPT_PATH)
+    openapi_cli = importlib.util.module_from_spec(module_spec)
+    module_spec.loader.exec_module(openapi_cli)
+    return openapi_cli
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--operations", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", type=argparse.FileType("w"), default=sys.stdout)
+    args = parser.parse_args()
+
+    openapi_cli = load_cli_module()
+    raw = json.dumps(generate_spec(args.operations, 8, 200)).encode()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, (suffix, module) in openapi_cli.SPEC_COMPRESSIONS.items():
+            start = time.perf_counter()
+            content = raw if module is None else importlib.import_module(module).compress(raw)
+            compress_seconds = time.perf_counter() - start
+
+            spec_path = os.path.join(workdir, f"openapi.json{suffix}")
+            with open(spec_path, "wb") as f:
+                f.write(content)
+
+            result = {
+                "format": name,
+                "raw_bytes": len(raw),
+                "cached_bytes": len(content),
+                "ratio": len(raw) / len(content),
+                "compress_seconds": compress_seconds,
+                "read_seconds": best_of(args.repeat, lambda: openapi_cli.read_spec(spec_path)),
+                "read_and_parse_seconds": best_of(
+                    args.repeat, lambda: json.loads(openapi_cli.read_spec(spec_path))
+                ),
+                "read_and_compile_seconds": best_of(
+                    args.repeat,
+                    lambda: openapi_cli.compile_spec(
+                        openapi_cli.parse_spec(openapi_cli.read_spec(spec_path))
+                    ),
+                ),
+            }
+            print(json.dumps(result), file=args.output, flush=True)
+
+
+if __name__ == "__main__":
+    main()
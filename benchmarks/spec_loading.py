@@ -0,0 +1,129 @@
+"""Peak memory and time of compiling a large spec, per spec loader.
+
+Compares the plain json.loads loader against the lazy parse_spec loader on a
+synthetic spec padded with examples and component schemas the CLI never
+needs. Each loader runs in a fresh interpreter; results are JSON lines:
+
+    python benchmarks/spec_loading.py --megabytes 100
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "openapi-cli.py")
+LOADERS = ["json", "lazy"]
+
+HARNESS = r"""
+import importlib.util
+import json
+import resource
+import sys
+import time
+
+script_path, spec_path, loader = sys.argv[1:]
+
+module_spec = importlib.util.spec_from_file_location("openapi_cli", script_path)
+openapi_cli = importlib.util.module_from_spec(module_spec)
+module_spec.loader.exec_module(openapi_cli)
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+start = time.perf_counter()
+spec_bytes = openapi_cli.read_spec(spec_path)
+if loader == "json":
+    document = json.loads(spec_bytes)
+else:
+    document = openapi_cli.parse_spec(spec_bytes)
+del spec_bytes
+plan = openapi_cli.compile_spec(document, "file://" + spec_path)
+elapsed = time.perf_counter() - start
+
+print(json.dumps({
+    "seconds": elapsed,
+    "operations": len(plan["operations"]),
+    "baseline_rss_kib": baseline,
+    "peak_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+"""
+
+
+def generate_spec(operations, example_size):
+    example = {"items": [{"id": index, "text": "x" * 64} for index in range(example_size)]}
+    paths = {}
+    for index in range(operations):
+        paths[f"/resource{index}/{{id}}"] = {
+            "parameters": [{"$ref": "#/components/parameters/Id"}],
+            "get": {
+                "summary": f"Fetch resource {index}",
+                "parameters": [{"$ref": "#/components/parameters/Limit"}],
+                "responses": {
+                    "200": {
+                        "description": "OK",
+                        "content": {
+                            "application/json": {
+                                "schema": {"$ref": f"#/components/schemas/Resource{index}"},
+                                "example": example,
+                            }
+                        },
+                    }
+                },
+            },
+        }
+    schemas = {
+        f"Resource{index}": {
+            "type": "object",
+            "properties": {f"field{number}": {"type": "string", "example": "x" * 64} for number in range(50)},
+        }
+        for index in range(operations)
+    }
+    return {
+        "openapi": "3.0.2",
+        "info": {"title": "Synthetic", "version": "1.0.0"},
+        "paths": paths,
+        "components": {
+            "parameters": {
+                "Id": {"name": "id", "in": "path", "required": True, "schema": {"type": "string"}},
+                "Limit": {"name": "limit", "in": "query", "required": False, "schema": {"type": "integer", "default": 10}},
+            },
+            "schemas": schemas,
+        },
+    }
+
+
+def write_spec(spec_path, operations):
+    with open(spec_path, "w") as f:
+        json.dump(generate_spec(operations, 40), f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megabytes", type=int, default=100, help="Approximate spec size")
+    parser.add_argument("--output", type=argparse.FileType("w"), default=sys.stdout)
+    args = parser.parse_args()
+
+    # Roughly 10 KiB per operation with the default example size
+    operations = max(1, args.megabytes * 100)
+    with tempfile.TemporaryDirectory() as workdir:
+        spec_path = os.path.join(workdir, "spec.json")
+        # Generate in a child process, so the loaders do not inherit its peak RSS
+        process = multiprocessing.Process(target=write_spec, args=(spec_path, operations))
+        process.start()
+        process.join()
+
+        for loader in LOADERS:
+            output = subprocess.run(
+                [sys.executable, "-c", HARNESS, SCRIPT_PATH, spec_path, loader],
+                check=True,
+                capture_output=True,
+            ).stdout
+            result = json.loads(output)
+            result.update({"loader": loader, "spec_bytes": os.path.getsize(spec_path)})
+            print(json.dumps(result), file=args.output, flush=True)
+
+
+if __name__ == "__main__":
+    main()
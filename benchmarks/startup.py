@@ -0,0 +1,168 @@
+"""Startup benchmarks for openapi-cli over synthetic specs of increasing size.
+
+Every measurement runs in a fresh interpreter against a file-based spec, so
+it reflects what a user pays per invocation. Requests are answered by a local
+stand-in server. Results are written as JSON lines, one per measurement:
+
+    python benchmarks/startup.py --sizes 10 1000 > startup.jsonl
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "openapi-cli.py")
+SIZES = [10, 1_000, 10_000, 50_000]
+PHASES = ["build", "help", "dispatch"]
+
+# Runs inside the child interpreter: build the CLI, then optionally render
+# help or dispatch a single command, and report timings and peak RSS.
+HARNESS = r"""
+import contextlib
+import importlib.util
+import io
+import json
+import resource
+import sys
+import time
+
+script_path, spec_path, phase = sys.argv[1:]
+
+start = time.perf_counter()
+module_spec = importlib.util.spec_from_file_location("openapi_cli", script_path)
+openapi_cli = importlib.util.module_from_spec(module_spec)
+module_spec.loader.exec_module(openapi_cli)
+imported = time.perf_counter()
+
+main = openapi_cli.create_cli(spec=spec_path)
+built = time.perf_counter()
+
+args = {
+    "build": None,
+    "help": ["get", "--help"],
+    "dispatch": ["get", "/resource0/{id}", "--id", "1"],
+}[phase]
+if args is not None:
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            main(args, standalone_mode=False)
+        except SystemExit:
+            pass
+done = time.perf_counter()
+
+print(json.dumps({
+    "import_seconds": imported - start,
+    "build_seconds": built - imported,
+    "phase_seconds": done - built,
+    "peak_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+"""
+
+
+def generate_spec(operations, parameters, description_length):
+    paths = {}
+    for index in range(operations):
+        paths[f"/resource{index}/{{id}}"] = {
+            "get": {
+                "summary": f"Fetch resource {index}",
+                "description": "lorem ipsum " * (description_length // 12),
+                "parameters": [
+                    {
+                        "name": "id",
+                        "in": "path",
+                        "required": True,
+                        "schema": {"type": "string"},
+                    }
+                ] + [
+                    {
+                        "name": f"filter{number}",
+                        "in": "query",
+                        "required": False,
+                        "description": f"Filter number {number}",
+                        "schema": {"type": "integer", "default": number},
+                    }
+                    # Vary the parameter count between operations
+                    for number in range(index % (parameters + 1))
+                ],
+            }
+        }
+    return {
+        "openapi": "3.0.2",
+        "info": {"title": "Synthetic", "version": "1.0.0"},
+        "paths": paths,
+    }
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = b'"OK"'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def measure(spec_path, phase, base_url, env):
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", HARNESS, SCRIPT_PATH, spec_path, phase],
+        check=True,
+        capture_output=True,
+        env=dict(env, OPENAPI_CLI_BASE_URL=base_url),
+    ).stdout
+    result = json.loads(output)
+    result["wall_seconds"] = time.perf_counter() - start
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--parameters", type=int, default=8, help="Maximum query parameters per operation")
+    parser.add_argument("--description-length", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=argparse.FileType("w"), default=sys.stdout)
+    args = parser.parse_args()
+
+    server, base_url = start_server()
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            spec_path = os.path.join(workdir, f"spec-{size}.json")
+            with open(spec_path, "w") as f:
+                json.dump(generate_spec(size, args.parameters, args.description_length), f)
+
+            # A fresh cache directory makes the first build a cold one
+            env = dict(os.environ, OPENAPI_CLI_CACHE_DIR=os.path.join(workdir, f"cache-{size}"))
+            for phase in PHASES:
+                for run in range(args.repeat):
+                    result = measure(spec_path, phase, base_url, env)
+                    result.update({
+                        "operations": size,
+                        "phase": phase,
+                        "run": run,
+                        "cache": "cold" if phase == PHASES[0] and run == 0 else "warm",
+                        "spec_bytes": os.path.getsize(spec_path),
+                    })
+                    print(json.dumps(result), file=args.output, flush=True)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
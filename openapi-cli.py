@@ -1,15 +1,301 @@
+import hashlib
+import json
+import marshal
 import os
-from functools import reduce
-from inspect import Parameter
-from inspect import signature
-
-import click
-import httpx
+import re
+import shlex
+import sys
 
 
 COMMAND_NAME = "openapi-cli"
 PROGRAM_NAME = "OpenAPI CLI"
-BASE_URL = "http://localhost:8000"
+BASE_URL = os.environ.get("OPENAPI_CLI_BASE_URL", "http://localhost:8000")
+CONFIG_PATH = os.environ.get(
+    "OPENAPI_CLI_CONFIG",
+    os.path.join(
+        os.environ.get("XDG_CONFIG_HOME", os.path.expanduser("~/.config")),
+        COMMAND_NAME,
+        "profiles.json",
+    ),
+)
+CACHE_DIR = os.environ.get(
+    "OPENAPI_CLI_CACHE_DIR",
+    os.path.join(
+        os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+        COMMAND_NAME,
+    ),
+)
+# Cached specs older than this (in seconds) are revalidated before use,
+# younger ones are used right away and revalidated in the background
+SPEC_TTL = float(os.environ.get("OPENAPI_CLI_SPEC_TTL", 24 * 60 * 60))
+# Cached specs younger than this (in seconds) are used without revalidating
+SPEC_REFRESH_INTERVAL = float(os.environ.get("OPENAPI_CLI_SPEC_REFRESH_INTERVAL", 5 * 60))
+# Settings of the built-in "default" profile, and the fallback for any setting
+# a profile in CONFIG_PATH leaves out
+DEFAULT_PROFILE = {
+    "base_url": BASE_URL,
+    "spec_ttl": SPEC_TTL,
+    "spec_refresh_interval": SPEC_REFRESH_INTERVAL,
+    "timeout": 5.0,
+    # Per phase timeouts, falling back to timeout when unset
+    "connect_timeout": None,
+    "read_timeout": None,
+    "write_timeout": None,
+    "pool_timeout": None,
+    "max_connections": 100,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry": 5.0,
+    # Requires the h2 package, i.e. httpx[http2]. HTTP/2 is negotiated over
+    # https, falling back to HTTP/1.1, while plain http stays on HTTP/1.1
+    # unless the server is known to speak HTTP/2 with prior knowledge.
+    "http2": False,
+    "http2_prior_knowledge": False,
+    # Maximum number of requests in flight when running operations concurrently
+    "concurrency": 10,
+    # Requests per second and burst size allowed by the client side rate
+    # limiter, shared by all requests in flight. Limits apply globally, per
+    # host or per operation, and no limit is applied when rate_limit is unset.
+    # Only batch and --each runs are limited, not separate invocations, so
+    # feed the calls of a shell loop to one of those instead.
+    "rate_limit": None,
+    "rate_burst": 1,
+    "rate_limit_scope": "global",
+    # Failed requests are retried up to this many times, with exponential
+    # backoff and full jitter unless the response has a Retry-After header.
+    # Only requests with a retry status or a transport error are retried, and
+    # not when Retry-After asks to wait longer than retry_backoff_max.
+    "retries": 3,
+    "retry_statuses": [429, 502, 503, 504],
+    "retry_methods": ["get", "head", "options", "put", "delete", "trace"],
+    "retry_backoff": 0.5,
+    "retry_backoff_max": 30.0,
+    # Retries per run are limited to retry_budget_min plus this share of the
+    # requests, so a failing server is not flooded with retries
+    "retry_budget": 0.2,
+    "retry_budget_min": 10,
+    # Log every request attempt with its timing to stderr
+    "verbose": False,
+    "cache_compression": "gzip",
+}
+# Formats cached specs can be stored in, as file suffix and compression module
+SPEC_COMPRESSIONS = {
+    "none": ("", None),
+    "gzip": (".gz", "gzip"),
+    "bz2": (".bz2", "bz2"),
+    "lzma": (".xz", "lzma"),
+}
+# Bump whenever the layout produced by compile_spec() changes
+PLAN_VERSION = 5
+# Bump whenever build_completion_index() indexes commands or options differently
+COMPLETION_VERSION = 6
+HTTP_METHODS = {"get", "put", "post", "delete", "options", "head", "patch", "trace"}
+# Shell completion is requested through this variable, e.g. bash_complete
+COMPLETE_VAR = "_OPENAPI_CLI_COMPLETE"
+# Background spec refreshes run the script with the profile in this variable
+REFRESH_VAR = "_OPENAPI_CLI_REFRESH"
+# Options consumed before the command tree is built, mapped to their env var
+GLOBAL_OPTIONS = {
+    "spec": "OPENAPI_CLI_SPEC",
+    "profile": "OPENAPI_CLI_PROFILE",
+}
+# Global options without a value, mapped to their env var. Each one enables
+# the profile setting of the same name.
+GLOBAL_FLAGS = {
+    "http2": "OPENAPI_CLI_HTTP2",
+    "verbose": "OPENAPI_CLI_VERBOSE",
+}
+
+
+def read_profile(name=None):
+    """Return the settings of a profile, raising KeyError when there is none."""
+    config = read_json_file(CONFIG_PATH, {})
+    profiles = config.get("profiles", {})
+    name = name or config.get("default", "default")
+    if name not in profiles and name != "default":
+        raise KeyError(name)
+
+    profile = dict(DEFAULT_PROFILE, name=name)
+    profile.update(profiles.get(name, {}))
+    return profile
+
+
+def get_cache_dir(profile, source):
+    # One directory per profile and source, so profiles never share a cache
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", source.split("://", 1)[-1]).strip("_")
+    digest = hashlib.sha256(source.encode()).hexdigest()[:12]
+    # Slugs of different names can collide, e.g. a.b and a-b, their digests not
+    profile_slug = re.sub(r"[^A-Za-z0-9]+", "_", profile["name"])
+    profile_digest = hashlib.sha256(profile["name"].encode()).hexdigest()[:12]
+    return os.path.join(CACHE_DIR, f"{profile_slug}-{profile_digest}", f"{slug}-{digest}")
+
+
+def read_json_file(path, default=None):
+    try:
+        with open(path, "rb") as f:
+            return json.loads(f.read())
+    except (OSError, ValueError):
+        return default
+
+
+def parse_global_options(args):
+    options = {
+        name: os.environ.get(envvar) for name, envvar in GLOBAL_OPTIONS.items()
+    }
+    for name, envvar in GLOBAL_FLAGS.items():
+        options[name] = os.environ.get(envvar, "").lower() in ("1", "true", "yes", "on")
+    # Global options must come before the first subcommand, as with click
+    args = iter(args)
+    for arg in args:
+        if not arg.startswith("--"):
+            break
+        name, has_value, value = arg[2:].partition("=")
+        if name in GLOBAL_FLAGS:
+            options[name] = True
+        elif name in options:
+            options[name] = value if has_value else next(args, None)
+    return options
+
+
+def get_spec_source(spec, profile):
+    if spec is not None:
+        from pathlib import Path
+        return Path(os.path.abspath(spec)).as_uri()
+    return profile["base_url"]
+
+
+def split_completion_words(words):
+    # Like click, keep whatever was parsed before an unclosed quote
+    lexer = shlex.shlex(words, posix=True)
+    lexer.whitespace_split = True
+    lexer.commenters = ""
+    result = []
+    try:
+        for token in lexer:
+            result.append(token)
+    except ValueError:
+        result.append(lexer.token)
+    return result
+
+
+def format_completion(shell, value, help):
+    if shell == "zsh":
+        if help:
+            # zsh splits the value from its help at the first unescaped colon
+            value = value.replace(":", r"\:")
+        return f"plain\n{value}\n{help or '_'}"
+    if shell == "fish" and help:
+        return f"plain,{value}\t{help}"
+    return f"plain,{value}"
+
+
+def complete_from_index(instruction):
+    """Answer a completion request from the prebuilt index, without a spec.
+
+    Returns None when the index cannot answer, so click has to, and raises
+    KeyError for an unknown profile.
+    """
+    shell, _, action = instruction.partition("_")
+    if action != "complete" or shell not in ("bash", "zsh", "fish"):
+        return None
+
+    words = split_completion_words(os.environ.get("COMP_WORDS", ""))
+    if shell == "fish":
+        incomplete = os.environ.get("COMP_CWORD", "")
+        incomplete = split_completion_words(incomplete)[0] if incomplete else ""
+        args = words[1:]
+        if incomplete and args and args[-1] == incomplete:
+            args.pop()
+    else:
+        cword = int(os.environ.get("COMP_CWORD", 0))
+        args = words[1:cword]
+        incomplete = words[cword] if cword < len(words) else ""
+
+    options = parse_global_options(args)
+    profile = read_profile(options["profile"])
+    cache_dir = get_cache_dir(profile, get_spec_source(options["spec"], profile))
+    if not os.path.isdir(cache_dir):
+        return None
+    # Only the root index file has a single dot, group files are <root>.<group>.marshal
+    prefix = f"completion-v{COMPLETION_VERSION}-"
+    root = None
+    for name in os.listdir(cache_dir):
+        if name.startswith(prefix) and name.endswith(".marshal") and name.count(".") == 1:
+            root = name[:-len(".marshal")]
+    if root is None:
+        return None
+
+    def load_index(suffix=""):
+        with open(os.path.join(cache_dir, f"{root}{suffix}.marshal"), "rb") as f:
+            return marshal.loads(f.read())
+
+    node = load_index()
+    if "group" in node:
+        node["commands"] = load_index(f".{node['group']}")
+    used = set()
+    args = iter(args)
+    for arg in args:
+        name = arg.partition("=")[0]
+        if name in node["options"]:
+            used.add(name)
+            takes_value, _ = node["options"][name]
+            if takes_value and "=" not in arg:
+                if next(args, None) is None:
+                    # Completing the value of an option, leave that to click
+                    return None
+        elif arg in node.get("commands", {}):
+            node = node["commands"][arg]
+            if "group" in node:
+                node["commands"] = load_index(f".{node['group']}")
+            used = set()
+        else:
+            return None
+
+    if incomplete.startswith("-"):
+        candidates = [
+            (name, help)
+            for name, (_, help) in node["options"].items()
+            if name.startswith(incomplete) and name not in used
+        ]
+    else:
+        candidates = [
+            (name, command["help"])
+            for name, command in node.get("commands", {}).items()
+            if name.startswith(incomplete)
+        ]
+    return "\n".join(format_completion(shell, value, help) for value, help in candidates)
+
+
+# Shell completion runs on every key press, so it is answered from the index
+# before click and the rest are imported, see complete_from_index()
+if __name__ == '__main__' and os.environ.get(COMPLETE_VAR) and not os.environ.get(REFRESH_VAR):
+    try:
+        completions = complete_from_index(os.environ[COMPLETE_VAR])
+    except KeyError as e:
+        # Reported as load_profile() does, without importing click for it
+        print(f"Error: Unknown profile '{e.args[0]}', profiles are read from {CONFIG_PATH}", file=sys.stderr)
+        sys.exit(2)
+    if completions is not None:
+        print(completions)
+        sys.exit(0)
+
+
+import atexit
+import csv
+import importlib
+import importlib.util
+import keyword
+import math
+import random
+import threading
+import time
+import urllib.parse
+from bisect import bisect_left
+from collections.abc import Mapping
+from inspect import getsource
+from inspect import signature
+from pathlib import Path
+
+import click
 
 
 def get_program_version():
@@ -42,16 +328,171 @@ def str_to_type(type_name):
         raise TypeError(f"Unknown type: {type_name}")
 
 
+def parse_option_value(type_name, value):
+    # Converts like click does for the options created by add_parameters()
+    if type_name == "boolean":
+        normalized = value.strip().lower()
+        if normalized in ("1", "true", "t", "yes", "y", "on"):
+            return True
+        if normalized in ("0", "false", "f", "no", "n", "off"):
+            return False
+        raise ValueError(f"{value!r} is not a valid boolean")
+    return str_to_type(type_name)(value)
+
+
+def parse_operation_args(options, args):
+    """Parse `--name value` arguments against the option table of an operation.
+
+    `options` maps each option name to its (type name, default, required).
+    Raises ValueError on unknown, missing or malformed options.
+    """
+    values = {}
+    args = iter(args)
+    for arg in args:
+        if not arg.startswith("--"):
+            raise ValueError(f"Got unexpected extra argument ({arg})")
+        name, has_value, value = arg[2:].partition("=")
+        if name not in options:
+            raise ValueError(f"No such option: --{name}")
+        if not has_value:
+            value = next(args, None)
+            if value is None:
+                raise ValueError(f"Option '--{name}' requires an argument.")
+        values[name] = value
+    return convert_operation_params(options, values)
+
+
+def convert_operation_params(options, params):
+    """Convert parameter values against the option table of an operation.
+
+    String values are parsed as their option type, other values are taken as
+    is, and defaults are filled in. Raises ValueError on unknown, missing or
+    malformed parameters.
+    """
+    values = {}
+    for name, value in params.items():
+        if name not in options:
+            raise ValueError(f"No such parameter: {name}")
+        if isinstance(value, str):
+            value = parse_option_value(options[name][0], value)
+        values[name] = value
+
+    for name, (_, default, required) in options.items():
+        if name not in values:
+            if default is None and required:
+                raise ValueError(f"Missing parameter: {name}")
+            values[name] = default
+    return values
+
+
+class Parameter:
+    __slots__ = ("name", "location", "description", "default", "required", "type_name")
+
+    def __init__(self, name, location, description, default, required, type_name):
+        self.name = sys.intern(name)
+        self.location = sys.intern(location)
+        self.description = description
+        self.default = default
+        self.required = required
+        self.type_name = sys.intern(type_name)
+
+    def to_row(self):
+        return (
+            self.name,
+            self.location,
+            self.description,
+            self.default,
+            self.required,
+            self.type_name,
+        )
+
+
+class Operation:
+    __slots__ = ("method", "path", "summary", "description", "_parameters", "parameter_rows", "tags")
+
+    def __init__(self, method, path, summary, description, parameters, tags):
+        self.method = sys.intern(method)
+        self.path = sys.intern(path)
+        self.summary = summary
+        self.description = description
+        self._parameters = parameters
+        self.parameter_rows = None
+        self.tags = tuple(map(sys.intern, tags))
+
+    @property
+    def parameters(self):
+        # Operations loaded from a plan only decode their parameters when used,
+        # which most of them never are in a single run
+        if self._parameters is None:
+            self._parameters = tuple(Parameter(*row) for row in self.parameter_rows)
+        return self._parameters
+
+    @property
+    def documentation(self):
+        return self.summary + "\n\n" + self.description
+
+    @property
+    def options(self):
+        # The option table used by parse_operation_args() and friends
+        return {
+            parameter.name: (parameter.type_name, parameter.default, parameter.required)
+            for parameter in self.parameters
+        }
+
+    def to_row(self):
+        if self._parameters is None:
+            parameter_rows = self.parameter_rows
+        else:
+            parameter_rows = tuple(parameter.to_row() for parameter in self._parameters)
+        return (
+            self.method,
+            self.path,
+            self.summary,
+            self.description,
+            parameter_rows,
+            self.tags,
+        )
+
+    @classmethod
+    def from_row(cls, row):
+        method, path, summary, description, parameter_rows, tags = row
+        operation = cls(method, path, summary, description, None, tags)
+        operation.parameter_rows = parameter_rows
+        return operation
+
+
+def python_identifier(name, taken):
+    identifier = re.sub(r"\W", "_", name).strip("_") or "_"
+    if identifier[0].isdigit() or keyword.iskeyword(identifier):
+        identifier = "_" + identifier
+    while identifier in taken:
+        identifier += "_"
+    taken.add(identifier)
+    return identifier
+
+
+def option_identifiers(parameters):
+    """Map the name of each parameter to the identifier its option is passed as.
+
+    Left to click, the identifier would be the lowercased name with dashes
+    as underscores, which does not map back to the name, e.g. for petId.
+    """
+    taken = {"fan_out"}
+    return {parameter.name: python_identifier(parameter.name, taken) for parameter in parameters}
+
+
 def add_parameters(parameters):
     def decorator(func):
 
+        identifiers = option_identifiers(parameters)
         for parameter in parameters:
             func = click.option(
-                f"--{parameter['name']}",
-                help=parameter.get("description", None),
-                default=parameter["schema"].get("default", None),
-                required=parameter.get("required", True),
-                type=str_to_type(parameter["schema"].get("type", "string")),
+                f"--{parameter.name}",
+                identifiers[parameter.name],
+                help=parameter.description,
+                default=parameter.default,
+                required=parameter.required,
+                type=str_to_type(parameter.type_name),
             )(func)
 
         return func
@@ -59,47 +500,1564 @@ def add_parameters(parameters):
     return decorator
 
 
-def create_command(method, path, documentation, parameters):
+# One pooled client per profile, shared by the spec fetch and single calls.
+# Concurrent calls run on the async client of an Executor instead
+CLIENTS = {}
+CLIENTS_LOCK = threading.Lock()
+
 
-    @click.command(name=path)
-    @add_doc(documentation)
-    @add_parameters(parameters)
-    def func(*args, **kwargs):
-        path_params = filter(lambda parameter: parameter["in"] == "path", parameters)
+def make_client(profile, asynchronous=False):
+    # The HTTP stack is imported lazily, as it dominates startup time
+    import httpx
+    if profile["http2"] and importlib.util.find_spec("h2") is None:
+        raise click.UsageError("HTTP/2 requires the h2 package, install httpx[http2]")
+    timeouts = {
+        phase: profile[f"{phase}_timeout"]
+        for phase in ("connect", "read", "write", "pool")
+        if profile[f"{phase}_timeout"] is not None
+    }
+    # httpx only negotiates HTTP/2 through TLS, dropping HTTP/1.1 is the only
+    # way to use it over plain http
+    http1 = not (profile["http2"] and profile["http2_prior_knowledge"])
+    client_class = httpx.AsyncClient if asynchronous else httpx.Client
+    return client_class(
+        http1=http1,
+        http2=profile["http2"],
+        timeout=httpx.Timeout(profile["timeout"], **timeouts),
+        limits=httpx.Limits(
+            max_connections=profile["max_connections"],
+            max_keepalive_connections=profile["max_keepalive_connections"],
+            keepalive_expiry=profile["keepalive_expiry"],
+        ),
+    )
 
-        # Template all path parameters
-        request_path = path
-        for parameter in path_params:
-            name = parameter["name"]
-            request_path = request_path.replace("{" + name + "}", str(kwargs[name]))
-            del kwargs[name]
 
-        response = httpx.request(method.upper(), BASE_URL + request_path, params=kwargs)
-        print(response.text)
+def get_client(profile):
+    with CLIENTS_LOCK:
+        if profile["name"] not in CLIENTS:
+            CLIENTS[profile["name"]] = make_client(profile)
+        return CLIENTS[profile["name"]]
+
+
+@atexit.register
+def close_clients():
+    with CLIENTS_LOCK:
+        for client in CLIENTS.values():
+            client.close()
+        CLIENTS.clear()
 
-    return func
 
+def build_request(operation, profile, kwargs):
+    """Return the method, URL and query parameters of a call to an operation."""
+    path_params = filter(
+        lambda parameter: parameter.location == "path", operation.parameters
+    )
+
+    # Template all path parameters
+    params = dict(kwargs)
+    request_path = operation.path
+    for parameter in path_params:
+        name = parameter.name
+        request_path = request_path.replace("{" + name + "}", str(params[name]))
+        del params[name]
+
+    return operation.method.upper(), profile["base_url"] + request_path, params
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, and up to `burst` at once."""
 
-def create_group(method, documentation):
-    @click.group(name=method)
-    @add_doc(documentation)
-    def func():
+    def __init__(self, rate, burst):
+        import asyncio
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        # Waiters queue up on the lock, so tokens are handed out first come
+        # first served
+        self.lock = asyncio.Lock()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        import asyncio
+        async with self.lock:
+            self.refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self.refill()
+            self.tokens -= 1
+
+
+def parse_retry_after(value):
+    # Either a number of seconds or an HTTP date
+    from email.utils import parsedate_to_datetime
+    try:
+        return max(0.0, float(value))
+    except ValueError:
         pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """Decides whether and when the attempts of operation calls are retried.
+
+    Besides the per call limit of the profile, retries are capped across all
+    calls by a budget of `retry_budget_min` plus `retry_budget` per call.
+    """
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.requests = 0
+        self.retries = 0
+
+    def delay(self, operation, attempt, response):
+        """Return how long to wait before retrying an attempt, or None to not retry."""
+        profile = self.profile
+        if operation.method not in profile["retry_methods"] or attempt > profile["retries"]:
+            return None
+        if response is not None and response.status_code not in profile["retry_statuses"]:
+            return None
+
+        delay = None
+        if response is not None and "retry-after" in response.headers:
+            delay = parse_retry_after(response.headers["retry-after"])
+        if delay is None:
+            backoff = profile["retry_backoff"] * 2 ** (attempt - 1)
+            delay = random.uniform(0, min(profile["retry_backoff_max"], backoff))
+        elif delay > profile["retry_backoff_max"]:
+            # Waiting longer than allowed, so return the response as it is
+            return None
+
+        if self.retries >= profile["retry_budget_min"] + profile["retry_budget"] * self.requests:
+            return None
+        self.retries += 1
+        return delay
+
+
+class Call:
+    """The attempts of one operation call, whichever client sends them.
+
+    Sending an attempt and waiting are left to the caller, everything else
+    is decided here: call start() before each attempt, and finish() with
+    its response or transport error after it.
+    """
+
+    def __init__(self, operation, profile, params, retry_policy):
+        self.operation = operation
+        self.profile = profile
+        self.method, self.url, self.query = build_request(operation, profile, params)
+        self.retry_policy = retry_policy
+        self.attempt = 0
+        self.started = None
+        retry_policy.requests += 1
+
+    def start(self):
+        self.attempt += 1
+        self.started = time.perf_counter()
+
+    def finish(self, response, error):
+        """Return how long to wait before the next attempt, or None when the
+        call is done. Raises a ClickException when the last attempt failed
+        with a transport error."""
+        elapsed = time.perf_counter() - self.started
+        delay = self.retry_policy.delay(self.operation, self.attempt, response)
+        if self.profile["verbose"]:
+            outcome = response.status_code if error is None else str(error) or type(error).__name__
+            retrying = "" if delay is None else f", retrying in {delay:.2f}s"
+            click.echo(
+                f"{self.method} {self.url} -> {outcome} in {elapsed * 1000:.1f}ms "
+                f"(attempt {self.attempt}){retrying}",
+                err=True,
+            )
+        if delay is None and error is not None:
+            attempts = "1 attempt" if self.attempt == 1 else f"{self.attempt} attempts"
+            raise click.ClickException(
+                f"{self.method} {self.url} failed after {attempts}: "
+                f"{str(error) or type(error).__name__}"
+            ) from error
+        return delay
+
+
+RATE_LIMIT_SCOPES = {
+    "global": lambda operation, url: None,
+    "host": lambda operation, url: urllib.parse.urlsplit(url).netloc,
+    "operation": lambda operation, url: (operation.method, operation.path),
+}
+
+
+class Executor:
+    """Runs operation calls concurrently over one pooled httpx.AsyncClient.
+
+    At most `concurrency` requests are in flight at once, and requests are
+    paced by the rate limit of the profile. Use it as an async context
+    manager, which closes the client on exit.
+    """
+
+    def __init__(self, profile, concurrency=None):
+        import asyncio
+        if profile["rate_limit_scope"] not in RATE_LIMIT_SCOPES:
+            raise click.UsageError(
+                f"Unknown rate_limit_scope '{profile['rate_limit_scope']}', "
+                f"expected one of: {', '.join(RATE_LIMIT_SCOPES)}"
+            )
+        self.profile = profile
+        self.concurrency = concurrency or profile["concurrency"]
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.buckets = {}
+        self.retry_policy = RetryPolicy(profile)
+        self.client = make_client(profile, asynchronous=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.client.aclose()
+
+    async def execute(self, operation, params):
+        import asyncio
+        import httpx
+        # Values may come as strings from any input, see convert_operation_params()
+        params = convert_operation_params(operation.options, params)
+        call = Call(operation, self.profile, params, self.retry_policy)
+        while True:
+            response = error = None
+            async with self.semaphore:
+                await self.rate_limit(operation, call.url)
+                call.start()
+                try:
+                    response = await self.client.request(call.method, call.url, params=call.query)
+                except httpx.TransportError as e:
+                    error = e
+
+            # The semaphore is released while backing off, but a call backing
+            # off still counts against the calls execute_all() runs at once
+            delay = call.finish(response, error)
+            if delay is None:
+                return response
+            await asyncio.sleep(delay)
+
+    async def rate_limit(self, operation, url):
+        if not self.profile["rate_limit"]:
+            return
+        key = RATE_LIMIT_SCOPES[self.profile["rate_limit_scope"]](operation, url)
+        if key not in self.buckets:
+            self.buckets[key] = TokenBucket(self.profile["rate_limit"], self.profile["rate_burst"])
+        await self.buckets[key].acquire()
+
+    async def execute_all(self, calls):
+        """Execute an iterable of (operation, params) calls concurrently.
+
+        Yields (index, response) in completion order, with the exception in
+        place of the response for failed calls. Calls are only taken from
+        `calls` as capacity frees up, and the ones still running are
+        cancelled when the iteration is stopped early.
+        """
+        import asyncio
+
+        async def run(index, operation, params):
+            try:
+                return index, await self.execute(operation, params)
+            except Exception as e:
+                return index, e
+
+        calls = enumerate(calls)
+        pending = set()
+        try:
+            while True:
+                for index, (operation, params) in calls:
+                    pending.add(asyncio.ensure_future(run(index, operation, params)))
+                    if len(pending) >= self.concurrency:
+                        break
+                if not pending:
+                    return
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+def send_operation(operation, profile, kwargs):
+    import httpx
+    # A single call goes through the shared client rather than an Executor,
+    # sparing an event loop and a client of its own. It is not rate limited,
+    # as buckets only live as long as a run
+    client = get_client(profile)
+    call = Call(operation, profile, kwargs, RetryPolicy(profile))
+    while True:
+        response = error = None
+        call.start()
+        try:
+            response = client.request(call.method, call.url, params=call.query)
+        except httpx.TransportError as e:
+            error = e
+
+        delay = call.finish(response, error)
+        if delay is None:
+            print(response.text)
+            return
+        time.sleep(delay)
+
+
+def read_batch(stream, input_format, operations, method=None, path=None, columns=None):
+    """Yield an (operation, params) call per record of a JSONL or CSV batch.
+
+    `operations` maps (method, path) to operations. A record that does not
+    make a valid call yields its ValueError instead, to be reported in place.
+    """
+    if input_format == "csv":
+        records = csv.DictReader(stream)
+    else:
+        records = (line for line in stream if line.strip())
+    columns = columns or {}
+
+    for record in records:
+        try:
+            if input_format == "csv":
+                record_method = method or record.get("method")
+                record_path = path or record.get("path")
+                params = {
+                    columns.get(column, column): value
+                    for column, value in record.items()
+                    if column not in (None, "method", "path") and value
+                }
+            else:
+                record = json.loads(record)
+                if not isinstance(record, dict):
+                    raise ValueError("Record is not an object")
+                record_method = record.get("method")
+                record_path = record.get("path")
+                params = record.get("params", {})
+                if not isinstance(params, dict):
+                    raise ValueError("Record params is not an object")
+
+            operation = operations.get((str(record_method).lower(), record_path))
+            if operation is None:
+                raise ValueError(f"No such operation: {record_method} {record_path}")
+            yield operation, convert_operation_params(operation.options, params)
+        except (TypeError, ValueError) as e:
+            yield ValueError(str(e))
+
+
+def response_body(response):
+    try:
+        return response.json()
+    except ValueError:
+        return response.text
+
+
+def result_record(result):
+    if isinstance(result, Exception):
+        return {"error": str(result) or type(result).__name__}
+    return {"status": result.status_code, "response": response_body(result)}
+
+
+async def run_fan_out(profile, operation, params, name, values):
+    """Execute an operation once per value of parameter `name`, and write a
+    JSON line per call as it completes. Returns the number of failed calls.
+    """
+    failed = 0
+    executing = {}
+
+    def calls():
+        for number, value in enumerate(values):
+            executing[number] = value
+            yield operation, dict(params, **{name: value})
+
+    async with Executor(profile) as executor:
+        async for number, result in executor.execute_all(calls()):
+            record = dict(value=executing.pop(number), **result_record(result))
+            failed += "error" in record
+            click.echo(json.dumps(record))
+    return failed
+
+
+async def run_batch(profile, calls, concurrency=None, order="input"):
+    """Execute batch calls and write a JSON line per call, in input order or
+    in completion order. Returns the number of calls that failed.
+    """
+    buffered = {}
+    next_index = 0
+    failed = 0
+
+    def emit(index, record):
+        nonlocal next_index
+        record = dict(index=index, **record)
+        if order == "completion":
+            click.echo(json.dumps(record))
+            return
+        # Results are held back until all earlier ones are written
+        buffered[index] = record
+        while next_index in buffered:
+            click.echo(json.dumps(buffered.pop(next_index)))
+            next_index += 1
+
+    # Invalid records are reported right away, and only valid calls executed.
+    # Maps the number execute_all() gives each call to its input index.
+    executing = {}
+
+    def valid_calls():
+        nonlocal failed
+        number = 0
+        for index, call in enumerate(calls):
+            if isinstance(call, Exception):
+                failed += 1
+                emit(index, {"error": str(call)})
+                continue
+            executing[number] = (index, call[0])
+            number += 1
+            yield call
+
+    async with Executor(profile, concurrency) as executor:
+        async for number, result in executor.execute_all(valid_calls()):
+            index, operation = executing.pop(number)
+            record = {"method": operation.method, "path": operation.path}
+            record.update(result_record(result))
+            failed += "error" in record
+            emit(index, record)
+    return failed
+
+
+FAN_OUT_HELP = (
+    "Run once per line of SOURCE, a file or - for stdin, passed as PARAM. "
+    "Results are written as JSON lines as they complete."
+)
+
+
+def has_fan_out(parameters):
+    # Operations with a parameter named each do without
+    names = [parameter.name for parameter in parameters]
+    return bool(names) and "each" not in names
+
+
+def add_fan_out(parameters):
+    names = [parameter.name for parameter in parameters]
+    identifiers = option_identifiers(parameters)
+
+    def parse_each(ctx, param, value):
+        if value is None:
+            return None
+        name, has_source, source = value.partition("=")
+        if not has_source or name not in names:
+            raise click.BadParameter(
+                f"{value!r} is not of the form PARAM=SOURCE, with PARAM one of: {', '.join(names)}"
+            )
+        # The values of the parameter come from the source instead. This is
+        # eager, so it runs before click checks for required options.
+        for option in ctx.command.params:
+            if option.name == identifiers[name]:
+                option.required = False
+        return name, source
+
+    def decorator(func):
+        if not has_fan_out(parameters):
+            return func
+        return click.option(
+            "--each",
+            "fan_out",
+            is_eager=True,
+            callback=parse_each,
+            metavar="PARAM=SOURCE",
+            help=FAN_OUT_HELP,
+        )(func)
+
+    return decorator
+
+
+def create_command(operation, profile):
+
+    @click.command(name=operation.path)
+    @add_doc(operation.documentation)
+    @add_parameters(operation.parameters)
+    @add_fan_out(operation.parameters)
+    def func(*args, fan_out=None, **kwargs):
+        # Calls take the parameters by name, as in the spec
+        kwargs = {
+            name: kwargs[identifier]
+            for name, identifier in option_identifiers(operation.parameters).items()
+        }
+        if fan_out is None:
+            send_operation(operation, profile, kwargs)
+            return
+
+        import asyncio
+        name, source = fan_out
+        try:
+            f = click.open_file(source)
+        except OSError as e:
+            raise click.FileError(source, hint=e.strerror) from None
+        with f:
+            values = (line.strip() for line in f if line.strip())
+            if asyncio.run(run_fan_out(profile, operation, kwargs, name, values)):
+                sys.exit(1)
+
     return func
 
 
-def create_cli():
-    spec_url=BASE_URL + "/openapi.json"
+class LazyMethodGroup(click.Group):
+    """Method group which only builds the commands for paths that are resolved."""
+
+    def __init__(self, name, operations, profile, **kwargs):
+        super().__init__(name=name, **kwargs)
+        self.operations = operations
+        self.profile = profile
+
+    def list_commands(self, ctx):
+        return sorted(self.commands.keys() | self.operations.keys())
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name not in self.commands and cmd_name in self.operations:
+            self.add_command(create_command(self.operations[cmd_name], self.profile))
+        return super().get_command(ctx, cmd_name)
+
+    def format_commands(self, ctx, formatter):
+        # Listing the group only needs the operation summaries, not the commands
+        paths = self.list_commands(ctx)
+        if not paths:
+            return
+        limit = formatter.width - 6 - max(len(path) for path in paths)
+        rows = []
+        for path in paths:
+            command = self.commands.get(path)
+            if command is None:
+                # A bare command without options, only used to shorten the help
+                command = click.Command(path, help=self.operations[path].documentation)
+            rows.append((path, command.get_short_help_str(limit)))
+        with formatter.section("Commands"):
+            formatter.write_dl(rows)
+
+
+def create_group(method, documentation, operations, profile):
+    return LazyMethodGroup(method, operations, profile, help=documentation)
+
+
+class LazyTagGroup(click.Group):
+    """Tag group which only builds the method groups of the tag when resolved."""
+
+    def __init__(self, name, operations, profile, **kwargs):
+        super().__init__(name=name, **kwargs)
+        self.operations = operations
+        self.profile = profile
+
+    def list_commands(self, ctx):
+        return sorted({operation.method for operation in self.operations})
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name not in self.commands:
+            operations = {
+                operation.path: operation
+                for operation in self.operations
+                if operation.method == cmd_name
+            }
+            if not operations:
+                return None
+            self.add_command(
+                create_group(
+                    cmd_name,
+                    f"Collection of {cmd_name} calls tagged {self.name}",
+                    operations,
+                    self.profile,
+                )
+            )
+        return super().get_command(ctx, cmd_name)
+
+    def format_commands(self, ctx, formatter):
+        rows = [
+            (method, f"Collection of {method} calls tagged {self.name}")
+            for method in self.list_commands(ctx)
+        ]
+        if rows:
+            with formatter.section("Commands"):
+                formatter.write_dl(rows)
+
 
-    response = httpx.get(spec_url)
-    response.raise_for_status()
-    openapi_json = response.json()
+def create_tag_group(tag, documentation, operations, profile):
+    return LazyTagGroup(tag, operations, profile, help=documentation)
+
+
+def load_profile(name=None, **flags):
+    try:
+        profile = read_profile(name)
+    except KeyError as e:
+        raise click.UsageError(
+            f"Unknown profile '{e.args[0]}', profiles are read from {CONFIG_PATH}"
+        ) from None
+    for flag, enabled in flags.items():
+        if enabled:
+            profile[flag] = True
+    return profile
+
+
+def remove_cache_files(cache_dir, prefix, suffix):
+    for name in os.listdir(cache_dir) if os.path.isdir(cache_dir) else ():
+        if name.startswith(prefix) and name.endswith(suffix):
+            os.remove(os.path.join(cache_dir, name))
+
+
+def write_cache_file(path, data):
+    # Write to a temporary file and rename, so concurrent runs never see a partial file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def get_accept_encoding():
+    # httpx decodes brotli and zstd only with optional packages installed, and
+    # zstd only since httpx 0.27
+    import httpx
+    encodings = ["gzip", "deflate"]
+    if any(importlib.util.find_spec(name) for name in ("brotli", "brotlicffi")):
+        encodings.insert(0, "br")
+    httpx_version = tuple(int(part) for part in re.findall(r"\d+", httpx.__version__)[:2])
+    if importlib.util.find_spec("zstandard") and httpx_version >= (0, 27):
+        encodings.insert(0, "zstd")
+    return ", ".join(encodings)
+
+
+def revalidate_spec(profile):
+    if profile["cache_compression"] not in SPEC_COMPRESSIONS:
+        raise click.UsageError(
+            f"Unknown cache_compression '{profile['cache_compression']}', "
+            f"expected one of: {', '.join(SPEC_COMPRESSIONS)}"
+        )
+    cache_dir = get_cache_dir(profile, profile["base_url"])
+    metadata_path = os.path.join(cache_dir, "metadata.json")
+
+    metadata = read_json_file(metadata_path, {})
+    spec_path = os.path.join(cache_dir, metadata.get("spec_file", "openapi.json"))
+    headers = {"Accept-Encoding": get_accept_encoding()}
+    if "digest" in metadata and os.path.exists(spec_path):
+        if "etag" in metadata:
+            headers["If-None-Match"] = metadata["etag"]
+        if "last_modified" in metadata:
+            headers["If-Modified-Since"] = metadata["last_modified"]
+
+    import httpx
+    spec_url = profile["base_url"] + "/openapi.json"
+    try:
+        response = get_client(profile).get(spec_url, headers=headers)
+        if response.status_code != 304:
+            response.raise_for_status()
+    except httpx.HTTPError as e:
+        raise click.ClickException(f"Cannot fetch the spec from {spec_url}: {e}") from e
+    if response.status_code == 304:
+        metadata["fetched_at"] = time.time()
+        write_cache_file(metadata_path, json.dumps(metadata).encode())
+        return metadata["digest"], spec_path
+
+    suffix, module = SPEC_COMPRESSIONS[profile["cache_compression"]]
+    content = response.content
+    if module is not None:
+        content = importlib.import_module(module).compress(content)
+
+    metadata = {
+        "digest": hashlib.sha256(response.content).hexdigest(),
+        "fetched_at": time.time(),
+        "spec_file": f"openapi.json{suffix}",
+    }
+    if "etag" in response.headers:
+        metadata["etag"] = response.headers["etag"]
+    if "last-modified" in response.headers:
+        metadata["last_modified"] = response.headers["last-modified"]
+
+    old_spec_path = spec_path
+    spec_path = os.path.join(cache_dir, metadata["spec_file"])
+    write_cache_file(spec_path, content)
+    write_cache_file(metadata_path, json.dumps(metadata).encode())
+    if old_spec_path != spec_path and os.path.exists(old_spec_path):
+        os.remove(old_spec_path)
+    return metadata["digest"], spec_path
+
+
+def refresh_spec(profile):
+    try:
+        revalidate_spec(profile)
+    except Exception:
+        # The cache is left as is, and the next run will try again
+        pass
+
+
+def fetch_spec(profile):
+    cache_dir = get_cache_dir(profile, profile["base_url"])
+    metadata_path = os.path.join(cache_dir, "metadata.json")
+    metadata = read_json_file(metadata_path, {})
+    spec_path = os.path.join(cache_dir, metadata.get("spec_file", "openapi.json"))
+
+    age = time.time() - metadata.get("fetched_at", 0)
+    if "digest" not in metadata or not os.path.exists(spec_path) or age >= profile["spec_ttl"]:
+        return revalidate_spec(profile)
+    if age < profile["spec_refresh_interval"]:
+        return metadata["digest"], spec_path
+
+    # Serve the cached spec now, and refresh it for the next run in a detached
+    # process, which neither delays the exit of this one nor is cut short by it.
+    # Its start is recorded, so runs meanwhile do not start refreshes of their
+    # own, and a refresh that fails is only retried after another interval.
+    if time.time() - metadata.get("refresh_started_at", 0) < profile["spec_refresh_interval"]:
+        return metadata["digest"], spec_path
+    metadata["refresh_started_at"] = time.time()
+    write_cache_file(metadata_path, json.dumps(metadata).encode())
+
+    import subprocess
+    subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__)],
+        env=dict(os.environ, **{REFRESH_VAR: json.dumps(profile)}),
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    return metadata["digest"], spec_path
+
+
+def read_spec(spec_path):
+    with open(spec_path, "rb") as f:
+        data = f.read()
+    # Compressed specs are recognized by their suffix, as they are cached
+    for suffix, module in SPEC_COMPRESSIONS.values():
+        if module is not None and spec_path.endswith(suffix):
+            return importlib.import_module(module).decompress(data)
+    return data
+
+
+JSON_DECODER = json.JSONDecoder()
+JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def skip_json_value(text, position, depth):
+    # Find the end of a value, without ever decoding more than one member of
+    # the outermost `depth` levels of objects at a time
+    if depth > 0 and text.startswith("{", position):
+        obj = LazyObject(text, position, depth - 1)
+        obj.scan()
+        return obj.end
+    return JSON_DECODER.raw_decode(text, position)[1]
+
+
+def decode_member_name(text, position):
+    """Decode the name of an object member, return it and where its value starts."""
+    name, position = JSON_DECODER.raw_decode(text, position)
+    if not isinstance(name, str):
+        raise ValueError(f"Expecting property name enclosed in double quotes at position {position}")
+    position = JSON_WHITESPACE.match(text, position).end()
+    if not text.startswith(":", position):
+        raise ValueError(f"Expecting ':' delimiter at position {position}")
+    return name, JSON_WHITESPACE.match(text, position + 1).end()
+
+
+class LazyObject(Mapping):
+    """A JSON object inside a larger document, decoded one member at a time.
+
+    Nested objects are returned as LazyObject as well, while items() streams
+    fully decoded members. Members which are never accessed are never decoded.
+    """
+
+    def __init__(self, text, start, depth=2):
+        self.text = text
+        self.start = start
+        self.end = None
+        self.depth = depth
+        # Start position of each member value scanned so far
+        self.members = {}
+        self.children = {}
+        self.position = start + 1
+        self.pending = None
+
+    def scan(self, key=None):
+        """Scan forward until the member `key` is found, or to the end."""
+        text = self.text
+        while self.end is None:
+            if self.pending is not None:
+                child = self.children.get(self.pending)
+                if child is not None and child.end is not None:
+                    self.position = child.end
+                else:
+                    self.position = skip_json_value(
+                        text, self.members[self.pending], self.depth
+                    )
+                self.pending = None
+
+            position = JSON_WHITESPACE.match(text, self.position).end()
+            if text.startswith(",", position):
+                position = JSON_WHITESPACE.match(text, position + 1).end()
+            if text.startswith("}", position):
+                self.end = position + 1
+                return
+
+            name, position = decode_member_name(text, position)
+            self.members[name] = position
+            self.position = position
+            self.pending = name
+            if name == key:
+                return
+
+    def __getitem__(self, key):
+        if key not in self.members:
+            self.scan(key)
+        position = self.members[key]
+        if not self.text.startswith("{", position):
+            return JSON_DECODER.raw_decode(self.text, position)[0]
+        if key not in self.children:
+            self.children[key] = LazyObject(self.text, position, max(self.depth - 1, 0))
+        return self.children[key]
+
+    def __iter__(self):
+        self.scan()
+        return iter(self.members)
+
+    def __len__(self):
+        self.scan()
+        return len(self.members)
+
+    def items(self):
+        for name, value, _, _ in self.iter_sources():
+            yield name, value
+
+    def iter_sources(self):
+        """Stream (key, value, start, end) for each member, in document order.
+
+        Each value is decoded exactly once, `start` and `end` delimit its text.
+        """
+        text = self.text
+        position = self.start + 1
+        while True:
+            position = JSON_WHITESPACE.match(text, position).end()
+            if text.startswith(",", position):
+                position = JSON_WHITESPACE.match(text, position + 1).end()
+            if text.startswith("}", position):
+                break
+            name, position = decode_member_name(text, position)
+            self.members.setdefault(name, position)
+            start = position
+            value, position = JSON_DECODER.raw_decode(text, position)
+            yield name, value, start, position
+        self.end = position + 1
+        self.pending = None
+
+
+def parse_spec(spec_bytes):
+    text = spec_bytes.decode("utf-8")
+    start = JSON_WHITESPACE.match(text).end()
+    if not text.startswith("{", start):
+        raise ValueError("An OpenAPI spec must be a JSON object")
+    return LazyObject(text, start)
+
+
+class RefResolver:
+    """Resolves $ref pointers, within the spec and into external files.
+
+    Every pointer is resolved once and the result is shared by all of its uses.
+    """
+
+    def __init__(self, document, base_uri, profile=None):
+        self.base_uri = base_uri
+        # External http(s) documents are fetched with the client of the profile
+        self.profile = profile
+        self.documents = {base_uri: document}
+        self.resolved = {}
+        self.resolving = set()
+
+    def load_document(self, uri):
+        if uri not in self.documents:
+            if uri.startswith(("http://", "https://")):
+                import httpx
+                try:
+                    response = get_client(self.profile or load_profile()).get(uri)
+                    response.raise_for_status()
+                except httpx.HTTPError as e:
+                    raise ValueError(f"Cannot load $ref document {uri}: {e}") from None
+                self.documents[uri] = parse_spec(response.content)
+            else:
+                # Only needed here, and it imports http.client and ssl
+                import urllib.request
+                path = urllib.request.url2pathname(urllib.parse.urlsplit(uri).path)
+                try:
+                    self.documents[uri] = parse_spec(read_spec(path))
+                except OSError as e:
+                    raise ValueError(f"Cannot load $ref document {uri}: {e}") from None
+        return self.documents[uri]
+
+    def resolve(self, obj, base_uri=None):
+        """Return the object a (possibly) $ref object points to, and its document URI."""
+        base_uri = base_uri or self.base_uri
+        if not isinstance(obj, Mapping) or "$ref" not in obj:
+            return obj, base_uri
+        return self.resolve_ref(urllib.parse.urljoin(base_uri, obj["$ref"]))
+
+    def resolve_ref(self, uri):
+        if uri in self.resolved:
+            return self.resolved[uri]
+        if uri in self.resolving:
+            raise ValueError(f"Circular $ref: {uri}")
+
+        self.resolving.add(uri)
+        try:
+            document_uri, _, fragment = uri.partition("#")
+            target = self.load_document(document_uri)
+            for token in urllib.parse.unquote(fragment).split("/")[1:]:
+                token = token.replace("~1", "/").replace("~0", "~")
+                try:
+                    target = target[int(token) if isinstance(target, list) else token]
+                except (KeyError, IndexError, TypeError, ValueError):
+                    raise ValueError(f"Unresolvable $ref: {uri}") from None
+            result = self.resolve(target, document_uri)
+        finally:
+            self.resolving.discard(uri)
+
+        self.resolved[uri] = result
+        return result
+
+
+def compile_parameter(resolver, parameter, base_uri):
+    obj, obj_uri = resolver.resolve(parameter, base_uri)
+    schema, _ = resolver.resolve(obj.get("schema", {}), obj_uri)
+    return Parameter(
+        obj["name"],
+        obj["in"],
+        obj.get("description", None),
+        schema.get("default", None),
+        obj.get("required", True),
+        schema.get("type", "string"),
+    )
+
+
+def compile_parameters(resolver, parameters, base_uri, compiled):
+    result = {}
+    for parameter in parameters:
+        if "$ref" in parameter:
+            ref_uri = urllib.parse.urljoin(base_uri, parameter["$ref"])
+            if ref_uri not in compiled:
+                compiled[ref_uri] = compile_parameter(resolver, parameter, base_uri)
+            compiled_parameter = compiled[ref_uri]
+        else:
+            compiled_parameter = compile_parameter(resolver, parameter, base_uri)
+        result[compiled_parameter.name, compiled_parameter.location] = compiled_parameter
+    return result
+
+
+def compile_path_item(resolver, path, obj, compiled):
+    obj, obj_uri = resolver.resolve(obj)
+    # Path level parameters apply to all operations, unless overridden
+    path_parameters = compile_parameters(
+        resolver, obj.get("parameters", []), obj_uri, compiled
+    )
+    operations = []
+    for method, mobj in obj.items():
+        if method not in HTTP_METHODS:
+            continue
+        parameters = dict(path_parameters)
+        parameters.update(
+            compile_parameters(
+                resolver, mobj.get("parameters", []), obj_uri, compiled
+            )
+        )
+        parameters = tuple(parameters.values())
+        operations.append(
+            Operation(
+                method,
+                path,
+                mobj.get("summary", ""),
+                mobj.get("description", ""),
+                parameters,
+                mobj.get("tags", []),
+            )
+        )
+    return operations
+
+
+def hash_text(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def iter_path_sources(openapi_json):
+    paths = openapi_json["paths"]
+    if isinstance(paths, LazyObject):
+        for path, obj, start, end in paths.iter_sources():
+            yield path, obj, paths.text[start:end]
+    else:
+        for path, obj in paths.items():
+            yield path, obj, json.dumps(obj, sort_keys=True)
+
+
+def hash_outside_paths(openapi_json):
+    # Everything but the paths, so mostly the components $refs point into
+    if isinstance(openapi_json, LazyObject):
+        paths = openapi_json["paths"]
+        if paths.end is None:
+            paths.scan()
+        digest = hashlib.sha256(openapi_json.text[:paths.start].encode())
+        digest.update(openapi_json.text[paths.end:].encode())
+        return digest.hexdigest()
+    rest = {key: value for key, value in openapi_json.items() if key != "paths"}
+    return hash_text(json.dumps(rest, sort_keys=True))
+
+
+def compile_spec(openapi_json, base_uri="", previous=None, profile=None):
+    """Compile the spec into a plan, see load_plan().
+
+    Operations of path items whose text is unchanged since the `previous`
+    plan are reused from it. Path items containing a $ref are only reused
+    if nothing outside the paths changed either.
+    """
+    resolver = RefResolver(openapi_json, base_uri, profile)
+    # Compiled Parameter objects, shared between all operations using a $ref
+    compiled = {}
+
+    previous_hashes = {"outside": None, "paths": {}}
+    previous_operations = {}
+    if previous is not None:
+        previous_hashes = previous["hashes"]
+        for operation in previous["operations"]:
+            previous_operations.setdefault(operation.path, []).append(operation)
+
+    path_hashes = {}
+    # Operations per path item, or the text of a path item which may be reused
+    path_operations = []
+    recompiled = set()
+    for path, obj, source in iter_path_sources(openapi_json):
+        path_hashes[path] = hash_text(source)
+        if path_hashes[path] == previous_hashes["paths"].get(path):
+            if '"$ref"' not in source:
+                path_operations.append(previous_operations.get(path, []))
+            else:
+                path_operations.append((path, source))
+            continue
+        path_operations.append(compile_path_item(resolver, path, obj, compiled))
+        recompiled.add(path)
+
+    outside_hash = hash_outside_paths(openapi_json)
+    operations = []
+    for item in path_operations:
+        if isinstance(item, tuple):
+            path, source = item
+            if outside_hash == previous_hashes["outside"]:
+                item = previous_operations.get(path, [])
+            else:
+                item = compile_path_item(resolver, path, json.loads(source), compiled)
+                recompiled.add(path)
+        operations.extend(item)
+
+    info = openapi_json["info"]
+    return {
+        "version": PLAN_VERSION,
+        "hashes": {"outside": outside_hash, "paths": path_hashes},
+        "recompiled": recompiled,
+        "openapi": openapi_json["openapi"],
+        "info": {
+            "title": info["title"],
+            "version": info["version"],
+            "description": info.get("description", ""),
+        },
+        "tags": {
+            tag["name"]: tag.get("description", "")
+            for tag in openapi_json.get("tags", [])
+        },
+        "operations": operations,
+    }
+
+
+def read_plan(plan_path):
+    try:
+        with open(plan_path, "rb") as f:
+            plan = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(plan, dict) or plan.get("version") != PLAN_VERSION:
+        return None
+    return plan
+
+
+def load_plan(cache_dir, digest, spec_path, base_uri, profile=None):
+    # The compiled operation table is keyed by the spec hash, so an unchanged
+    # spec never has to be parsed again
+    plan_path = os.path.join(cache_dir, f"plan-v{PLAN_VERSION}-{digest}.marshal")
+    plan = read_plan(plan_path)
+    if plan is not None:
+        plan["operations"] = [Operation.from_row(row) for row in plan["operations"]]
+        return plan
+
+    # The plan of the previous spec, to only recompile what changed since
+    previous = None
+    previous_digest = None
+    prefix = f"plan-v{PLAN_VERSION}-"
+    for name in os.listdir(cache_dir) if os.path.isdir(cache_dir) else ():
+        if name.startswith(prefix) and name.endswith(".marshal"):
+            previous = read_plan(os.path.join(cache_dir, name))
+            previous_digest = name[len(prefix):-len(".marshal")]
+    if previous is not None:
+        previous["operations"] = [
+            Operation.from_row(row) for row in previous["operations"]
+        ]
+
+    # Only the parts of the spec the CLI needs are ever decoded, and they are
+    # dropped as soon as the spec has been compiled
+    try:
+        plan = compile_spec(parse_spec(read_spec(spec_path)), base_uri, previous, profile)
+    except ValueError as e:
+        raise click.ClickException(f"Invalid spec {base_uri}: {e}") from None
+    recompiled = plan.pop("recompiled")
+    if previous is not None:
+        changes = diff_plans(previous, plan, recompiled)
+        changes.update({"from": previous_digest, "to": digest, "time": time.time()})
+        write_cache_file(
+            os.path.join(cache_dir, "spec-diff.json"), json.dumps(changes).encode()
+        )
+
+    remove_cache_files(cache_dir, "plan-", ".marshal")
+    rows = [operation.to_row() for operation in plan["operations"]]
+    write_cache_file(plan_path, marshal.dumps(dict(plan, operations=rows)))
+    return plan
+
+
+def diff_plans(previous, plan, recompiled):
+    old = {(operation.method, operation.path): operation for operation in previous["operations"]}
+    new = {(operation.method, operation.path): operation for operation in plan["operations"]}
+    return {
+        "added": [key for key in new if key not in old],
+        "removed": [key for key in old if key not in new],
+        # Reused operations are unchanged by definition
+        "changed": [
+            key
+            for key, operation in new.items()
+            if key in old
+            and operation.path in recompiled
+            and operation.to_row() != old[key].to_row()
+        ],
+    }
+
+
+SEARCH_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return SEARCH_TOKEN.findall(text.lower()) if text else []
+
+
+def build_search_index(operations):
+    # Inverted index from each term to the operations using it, weighted by
+    # where the term occurs
+    postings = {}
+    for number, operation in enumerate(operations):
+        fields = [
+            (operation.path, 3.0),
+            (operation.summary, 2.0),
+            (operation.description, 1.0),
+        ]
+        for parameter in operation.parameters:
+            fields.append((parameter.name, 2.0))
+            fields.append((parameter.description, 0.5))
+
+        weights = {}
+        for text, weight in fields:
+            for term in tokenize(text):
+                weights[term] = weights.get(term, 0.0) + weight
+        for term, weight in weights.items():
+            postings.setdefault(term, []).append((number, weight))
+
+    return {
+        "operations": [
+            (operation.method, operation.path, operation.summary)
+            for operation in operations
+        ],
+        "terms": sorted(postings),
+        "postings": postings,
+    }
+
+
+def search_operations(index, query):
+    """Rank operations by how many query terms they match, then by tf-idf.
+
+    Query terms also match every indexed term they are a prefix of.
+    """
+    count = len(index["operations"])
+    terms = index["terms"]
+    matched = {}
+    scores = {}
+    for query_term in tokenize(query):
+        hits = {}
+        position = bisect_left(terms, query_term)
+        while position < len(terms) and terms[position].startswith(query_term):
+            postings = index["postings"][terms[position]]
+            idf = math.log(1 + count / len(postings))
+            # Exact matches count in full, prefix matches for half
+            factor = 1.0 if terms[position] == query_term else 0.5
+            for number, weight in postings:
+                hits[number] = max(hits.get(number, 0.0), weight * idf * factor)
+            position += 1
+        for number, score in hits.items():
+            matched[number] = matched.get(number, 0) + 1
+            scores[number] = scores.get(number, 0.0) + score
+
+    ranked = sorted(scores, key=lambda number: (-matched[number], -scores[number], number))
+    return [index["operations"][number] for number in ranked]
+
+
+# Request and argv handling of generated modules, see generate_module()
+GENERATED_RUNTIME = '''
+def send(method, path, path_params, params):
+    import httpx
+
+    # Template all path parameters
+    for name, value in path_params.items():
+        path = path.replace("{" + name + "}", str(value))
+    response = httpx.request(method.upper(), BASE_URL + path, params=params, timeout=TIMEOUT)
+    print(response.text)
+    return response
+
+
+def usage():
+    print(f"Usage: {sys.argv[0]} METHOD PATH [--OPTION VALUE]...")
+    print()
+    print(TITLE)
+    print()
+    print("Operations:")
+    for (method, path), (function, _, _) in sorted(OPERATIONS.items()):
+        summary = (function.__doc__ or "").strip().split("\\n")[0]
+        print(f"  {method} {path}  {summary}")
+
+
+def main(args=None):
+    args = sys.argv[1:] if args is None else args
+    if len(args) < 2 or args[0] in ("-h", "--help"):
+        usage()
+        return 0 if args[:1] in (["-h"], ["--help"]) else 2
+
+    operation = OPERATIONS.get((args[0], args[1]))
+    if operation is None:
+        print(f"Error: No such operation: {args[0]} {args[1]}", file=sys.stderr)
+        return 2
+    function, options, identifiers = operation
+    if "--help" in args[2:]:
+        print(function.__doc__)
+        for name, (type_name, default, required) in options.items():
+            print(f"  --{name} {type_name.upper()}" + ("  [required]" if required else ""))
+        return 0
+
+    try:
+        values = parse_operation_args(options, args[2:])
+    except (TypeError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    function(**{identifiers[name]: value for name, value in values.items()})
+    return 0
+'''
+
+
+# Module level names of generated modules, which generated identifiers must
+# not shadow
+GENERATED_GLOBALS = {
+    "os",
+    "sys",
+    "TITLE",
+    "BASE_URL",
+    "TIMEOUT",
+    "OPERATIONS",
+    "str_to_type",
+    "parse_option_value",
+    "parse_operation_args",
+    "convert_operation_params",
+    "send",
+    "usage",
+    "main",
+}
+
+
+def generate_module(plan, profile):
+    """Return the source of a standalone module which runs the operations of
+    the plan, with one plain function per operation and no spec to load."""
+    info = plan["info"]
+    lines = [
+        f'"""{info["title"]} {info["version"]} command line client.',
+        "",
+        f"Generated using {COMMAND_NAME} ({PROGRAM_NAME}) {get_program_version()}.",
+        '"""',
+        "import os",
+        "import sys",
+        "",
+        "",
+        f"TITLE = {info['title']!r}",
+        f"BASE_URL = os.environ.get(\"OPENAPI_CLI_BASE_URL\", {profile['base_url']!r})",
+        f"TIMEOUT = {profile['timeout']!r}",
+        "",
+        "",
+    ]
+    for func in (str_to_type, parse_option_value, parse_operation_args, convert_operation_params):
+        lines.extend([getsource(func), ""])
+    lines.append(GENERATED_RUNTIME)
+
+    functions = set(GENERATED_GLOBALS)
+    table = []
+    for operation in plan["operations"]:
+        function = python_identifier(f"{operation.method}_{operation.path}", functions)
+        identifiers = {}
+        arguments = set(GENERATED_GLOBALS)
+        for parameter in operation.parameters:
+            identifiers[parameter.name] = python_identifier(parameter.name, arguments)
+
+        path_params = ", ".join(
+            f"{parameter.name!r}: {identifiers[parameter.name]}"
+            for parameter in operation.parameters
+            if parameter.location == "path"
+        )
+        params = ", ".join(
+            f"{parameter.name!r}: {identifiers[parameter.name]}"
+            for parameter in operation.parameters
+            if parameter.location != "path"
+        )
+        lines.extend([
+            "",
+            f"def {function}({', '.join(identifiers.values())}):",
+            f"    {operation.documentation!r}",
+            f"    return send({operation.method!r}, {operation.path!r}, {{{path_params}}}, {{{params}}})",
+            "",
+        ])
+
+        table.append(
+            f"    ({operation.method!r}, {operation.path!r}): "
+            f"({function}, {operation.options!r}, {identifiers!r}),"
+        )
+
+    lines.extend(["", "OPERATIONS = {", *table, "}", "", ""])
+    lines.append('if __name__ == "__main__":\n    sys.exit(main())\n')
+    return "\n".join(lines)
+
+
+def build_completion_index(command, groups, key=""):
+    """Index the commands and options below `command`, as used for completion.
+
+    The commands of each LazyMethodGroup go in `groups` instead, so a
+    completion only has to load the index of the group it completes in.
+    """
+    options = {}
+    for param in command.get_params(click.Context(command)):
+        if isinstance(param, click.Option) and not param.hidden:
+            for opt in param.opts:
+                options[opt] = (not param.is_flag, param.help or "")
+    index = {"help": command.get_short_help_str(), "options": options}
+
+    if isinstance(command, LazyMethodGroup):
+        # Read straight from the operations, building their commands is slow
+        index["group"] = re.sub(r"[^A-Za-z0-9]+", "_", key)
+        groups[index["group"]] = {
+            path: {
+                "help": click.Command(path, help=operation.documentation).get_short_help_str(),
+                "options": {
+                    **{
+                        f"--{parameter.name}": (True, parameter.description or "")
+                        for parameter in operation.parameters
+                    },
+                    **({"--each": (True, FAN_OUT_HELP)} if has_fan_out(operation.parameters) else {}),
+                    "--help": (False, "Show this message and exit."),
+                },
+            }
+            for path, operation in sorted(command.operations.items())
+        }
+    elif isinstance(command, click.Group):
+        index["commands"] = {
+            name: build_completion_index(
+                command.get_command(None, name), groups, f"{key}.{name}" if key else name
+            )
+            for name in command.list_commands(None)
+        }
+    return index
+
+
+def locate_spec(spec, profile):
+    # Checked here, as the spec is read before click validates any option
+    if spec is not None and not os.path.isfile(spec):
+        raise click.BadParameter(f"File '{spec}' does not exist.", param_hint="'--spec'")
+    cache_dir = get_cache_dir(profile, get_spec_source(spec, profile))
+    if spec is not None:
+        spec_path = os.path.abspath(spec)
+        spec_uri = Path(spec_path).as_uri()
+        digest = hashlib.sha256(read_spec(spec_path)).hexdigest()
+    else:
+        spec_uri = profile["base_url"] + "/openapi.json"
+        digest, spec_path = fetch_spec(profile)
+    return cache_dir, digest, spec_path, spec_uri
+
+
+def dispatch_operation(args, profile, located):
+    """Run a fully specified `METHOD PATH --OPTION VALUE...` call straight from
+    the cached plan, without building the click command tree. `located` is
+    the spec as returned by locate_spec().
+
+    Returns False when click has to handle the arguments instead, i.e. for
+    help, invalid or unknown input, or a spec that was not compiled yet.
+    """
+    args = list(args)
+    while args and args[0].startswith("--"):
+        name, has_value, _ = args.pop(0)[2:].partition("=")
+        if name in GLOBAL_FLAGS and not has_value:
+            continue
+        if name not in GLOBAL_OPTIONS:
+            return False
+        if not has_value and not args:
+            return False
+        if not has_value:
+            args.pop(0)
+    if len(args) < 2 or args[0] not in HTTP_METHODS or "--help" in args:
+        return False
+
+    cache_dir, digest, _, _ = located
+    plan = read_plan(os.path.join(cache_dir, f"plan-v{PLAN_VERSION}-{digest}.marshal"))
+    if plan is None:
+        return False
+    rows = [row for row in plan["operations"] if row[0] == args[0] and row[1] == args[1]]
+    if len(rows) != 1:
+        return False
+
+    operation = Operation.from_row(rows[0])
+    try:
+        kwargs = parse_operation_args(operation.options, args[2:])
+    except (TypeError, ValueError):
+        return False
+    send_operation(operation, profile, kwargs)
+    return True
+
+
+def create_cli(spec=None, profile=None, located=None, **flags):
+    profile = load_profile(profile, **flags)
+    # The spec may already be located, so it is not fetched twice
+    cache_dir, digest, spec_path, spec_uri = located or locate_spec(spec, profile)
+    plan = load_plan(cache_dir, digest, spec_path, spec_uri, profile)
 
     @click.group()
-    @add_doc(openapi_json["info"]["title"] + "\n" + openapi_json["info"].get("description", ""))
+    @click.option(
+        "--spec",
+        envvar=GLOBAL_OPTIONS["spec"],
+        expose_value=False,
+        type=click.Path(exists=True, dir_okay=False),
+        help="Build the CLI from a local OpenAPI spec file, without contacting the server.",
+    )
+    @click.option(
+        "--profile",
+        envvar=GLOBAL_OPTIONS["profile"],
+        expose_value=False,
+        help=f"Server profile to use, as configured in {CONFIG_PATH}.",
+    )
+    @click.option(
+        "--http2",
+        is_flag=True,
+        envvar=GLOBAL_FLAGS["http2"],
+        expose_value=False,
+        help="Use HTTP/2 where the server negotiates it, multiplexing requests "
+        "over a single connection.",
+    )
+    @click.option(
+        "--verbose",
+        is_flag=True,
+        envvar=GLOBAL_FLAGS["verbose"],
+        expose_value=False,
+        help="Log every request attempt with its timing to stderr.",
+    )
+    @add_doc(plan["info"]["title"] + "\n" + plan["info"]["description"])
     def main():
         pass
 
+    @main.command()
+    @click.argument("output", type=click.File("w"))
+    def generate(output):
+        """Write a standalone Python module running the operations of this API.
+
+        The module has one plain function per operation and needs neither
+        this tool nor the spec, only httpx to send requests.
+        """
+        output.write(generate_module(plan, profile))
+
+    def parse_columns(ctx, param, value):
+        columns = {}
+        for mapping in value:
+            column, has_param, name = mapping.partition("=")
+            if not has_param:
+                raise click.BadParameter(f"{mapping!r} is not of the form COLUMN=PARAM")
+            columns[column] = name
+        return columns
+
+    @main.command()
+    @click.argument("input", type=click.File("r"), default="-")
+    @click.option(
+        "--format",
+        "input_format",
+        type=click.Choice(["jsonl", "csv"]),
+        help="Input format, by default csv for .csv files and jsonl otherwise.",
+    )
+    @click.option("--method", help="Method of all CSV rows, instead of a method column.")
+    @click.option("--path", help="Path of all CSV rows, instead of a path column.")
+    @click.option(
+        "--column",
+        "columns",
+        multiple=True,
+        metavar="COLUMN=PARAM",
+        callback=parse_columns,
+        help="Pass a CSV column as a parameter, columns are passed by their own name by default.",
+    )
+    @click.option(
+        "--concurrency",
+        type=click.IntRange(1),
+        help=f"Maximum number of requests in flight.  [default: {profile['concurrency']}]",
+    )
+    @click.option(
+        "--order",
+        type=click.Choice(["input", "completion"]),
+        default="input",
+        show_default=True,
+        help="Write results in input order, or as they complete.",
+    )
+    def batch(input, input_format, method, path, columns, concurrency, order):
+        """Run the operation calls of a JSONL or CSV file, or stdin, concurrently.
+
+        JSONL records look like {"method": "get", "path": "/book/{name}",
+        "params": {"name": "Hamlet"}}. A JSON line is written per record with
+        its index and either the response status and body, or an error.
+        """
+        import asyncio
+        if input_format is None:
+            input_format = "csv" if input.name.endswith(".csv") else "jsonl"
+        operations = {
+            (operation.method, operation.path): operation
+            for operation in plan["operations"]
+        }
+        calls = read_batch(input, input_format, operations, method, path, columns)
+        if asyncio.run(run_batch(profile, calls, concurrency, order)):
+            sys.exit(1)
+
+    @main.command()
+    @click.argument("query", nargs=-1, required=True)
+    @click.option(
+        "--limit",
+        type=click.IntRange(1),
+        default=10,
+        show_default=True,
+        help="Maximum number of matches to show.",
+    )
+    def find(query, limit):
+        """Search operations by path, parameters, summary and description."""
+        # Built once per spec, on first use
+        index_path = os.path.join(cache_dir, f"search-v{PLAN_VERSION}-{digest}.marshal")
+        try:
+            with open(index_path, "rb") as f:
+                index = marshal.loads(f.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            index = build_search_index(plan["operations"])
+            remove_cache_files(cache_dir, "search-", ".marshal")
+            write_cache_file(index_path, marshal.dumps(index))
+
+        matches = search_operations(index, " ".join(query))[:limit]
+        width = max((len(method) + len(path) for method, path, _ in matches), default=0)
+        for method, path, summary in matches:
+            click.echo(f"{method} {path}".ljust(width + 3) + summary)
+
     @main.group()
     def meta():
         """Various meta endpoints."""
@@ -109,14 +2067,27 @@ def create_cli():
     # meta contact endpoint
     # meta license endpoint
 
-    # TODO: Add support for tags grouping
+    @meta.command(name="spec-diff", help="Show the operations changed by the last spec update")
+    def spec_diff():
+        changes = read_json_file(os.path.join(cache_dir, "spec-diff.json"))
+        if changes is None:
+            click.echo("No spec changes recorded.")
+            return
+
+        changed_at = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(changes["time"]))
+        click.echo(f"Spec {changes['from'][:12]} -> {changes['to'][:12]} ({changed_at})")
+        for marker, key in (("+", "added"), ("-", "removed"), ("~", "changed")):
+            for method, path in changes[key]:
+                click.echo(f"{marker} {method} {path}")
+        if not any(changes[key] for key in ("added", "removed", "changed")):
+            click.echo("No operations changed.")
 
     @meta.command(help="Output version information and exit")
     def version():
-        project_name = openapi_json["info"]["title"]
-        project_version = openapi_json["info"]["version"]
+        project_name = plan["info"]["title"]
+        project_version = plan["info"]["version"]
 
-        openapi_version = openapi_json["openapi"]
+        openapi_version = plan["openapi"]
 
         version = get_program_version()
         license = get_program_license()
@@ -132,27 +2103,65 @@ def create_cli():
         ]
         click.echo("\n".join(lines))
 
-    method_keys = reduce(
-        set.union, (set(obj.keys()) for obj in openapi_json["paths"].values())
-    )
-    methods = {
-        method: create_group(method, f"Collection of {method} calls")
-        for method in method_keys
-    }
-    for group in methods.values():
-        main.add_command(group)
+    # Commands are only created once click resolves them, see LazyMethodGroup
+    operations = {}
+    for operation in plan["operations"]:
+        operations.setdefault(operation.method, {})[operation.path] = operation
+
+    for method, method_operations in operations.items():
+        main.add_command(
+            create_group(
+                method, f"Collection of {method} calls", method_operations, profile
+            )
+        )
+
+    # Tag groups only sort their operations by method once resolved, see LazyTagGroup
+    tags = {}
+    for operation in plan["operations"]:
+        for tag in operation.tags:
+            tags.setdefault(tag, []).append(operation)
 
-    for path, obj in openapi_json["paths"].items():
-        for method, mobj in obj.items():
-            summary = mobj.get("summary", "") + "\n\n" + mobj.get("description", "")
-            parameters = mobj.get("parameters", [])
+    for tag, tag_operations in tags.items():
+        # Method groups and built-in commands take precedence over tags
+        if tag in main.commands:
+            continue
+        documentation = plan["tags"].get(tag) or f"Collection of calls tagged {tag}"
+        main.add_command(create_tag_group(tag, documentation, tag_operations, profile))
 
-            func = create_command(method, path, summary, parameters)
-            methods[method].add_command(func)
+    # Written once per spec, to answer shell completion without building the
+    # CLI. The root index is written last, as it marks the index complete.
+    index_path = os.path.join(cache_dir, f"completion-v{COMPLETION_VERSION}-{digest}.marshal")
+    if not os.path.exists(index_path):
+        remove_cache_files(cache_dir, "completion-", ".marshal")
+        groups = {}
+        index = build_completion_index(main, groups)
+        for name, group in groups.items():
+            group_path = os.path.join(
+                cache_dir, f"completion-v{COMPLETION_VERSION}-{digest}.{name}.marshal"
+            )
+            write_cache_file(group_path, marshal.dumps(group))
+        write_cache_file(index_path, marshal.dumps(index))
 
     return main
 
 
 if __name__ == '__main__':
-    main = create_cli()
-    main()
+    refresh = os.environ.get(REFRESH_VAR)
+    if refresh:
+        refresh_spec(json.loads(refresh))
+        sys.exit(0)
+    try:
+        # Completions the index could not answer, see the top of the script
+        instruction = os.environ.get(COMPLETE_VAR)
+        options = parse_global_options(sys.argv[1:])
+        profile = load_profile(
+            options["profile"], **{flag: options[flag] for flag in GLOBAL_FLAGS}
+        )
+        located = locate_spec(options["spec"], profile)
+        if not instruction and dispatch_operation(sys.argv[1:], profile, located):
+            sys.exit(0)
+        main = create_cli(located=located, **options)
+    except click.ClickException as e:
+        e.show()
+        sys.exit(e.exit_code)
+    main(complete_var=COMPLETE_VAR)
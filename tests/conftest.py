@@ -0,0 +1,55 @@
+import importlib.util
+import os
+
+import pytest
+
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "openapi-cli.py")
+
+
+@pytest.fixture(scope="session")
+def openapi_cli():
+    # The script is not importable by name, as it has a dash in it
+    module_spec = importlib.util.spec_from_file_location("openapi_cli", SCRIPT_PATH)
+    module = importlib.util.module_from_spec(module_spec)
+    module_spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def make_operation(openapi_cli):
+    """Return a factory of operations, with a string query parameter per name."""
+    def make_operation(method="get", path="/books/", names=()):
+        parameters = [
+            openapi_cli.Parameter(name, "query", f"The {name}", None, False, "string")
+            for name in names
+        ]
+        return openapi_cli.Operation(method, path, "", "", parameters, [])
+    return make_operation
+
+
+@pytest.fixture
+def isolated_cache(openapi_cli, monkeypatch, tmp_path):
+    # Neither the cache nor the profiles of the user are touched
+    monkeypatch.setattr(openapi_cli, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(openapi_cli, "CONFIG_PATH", str(tmp_path / "profiles.json"))
+    return tmp_path
+
+
+@pytest.fixture
+def sent_urls(openapi_cli, monkeypatch):
+    """Answer every request of the CLI with 200 and its URL, and record the URLs."""
+    import httpx
+    urls = []
+
+    def handler(request):
+        urls.append(str(request.url))
+        return httpx.Response(200, json={"url": str(request.url)})
+
+    def make_client(profile, asynchronous=False):
+        client_class = httpx.AsyncClient if asynchronous else httpx.Client
+        return client_class(transport=httpx.MockTransport(handler))
+
+    monkeypatch.setattr(openapi_cli, "make_client", make_client)
+    monkeypatch.setattr(openapi_cli, "CLIENTS", {})
+    return urls
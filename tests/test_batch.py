@@ -0,0 +1,105 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+
+@pytest.fixture
+def profile(openapi_cli):
+    return dict(openapi_cli.DEFAULT_PROFILE, name="test", base_url="http://api.test")
+
+
+@pytest.fixture
+def answer_after_delay(openapi_cli, monkeypatch):
+    """Answer every request after the number of seconds in its delay parameter,
+    and record the requests in flight."""
+    state = {"in_flight": 0, "cancelled": 0}
+
+    async def handler(request):
+        state["in_flight"] += 1
+        try:
+            await asyncio.sleep(float(request.url.params.get("delay", 0)))
+        except asyncio.CancelledError:
+            state["cancelled"] += 1
+            raise
+        finally:
+            state["in_flight"] -= 1
+        return httpx.Response(200, json={"url": str(request.url)})
+
+    monkeypatch.setattr(
+        openapi_cli,
+        "make_client",
+        lambda profile, asynchronous=False: httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    return state
+
+
+@pytest.mark.parametrize("order, indexes", [("input", [0, 1, 2, 3]), ("completion", [1, 2, 3, 0])])
+def test_run_batch_writes_each_result_at_its_input_index(
+    openapi_cli, profile, answer_after_delay, make_operation, capsys, order, indexes
+):
+    operation = make_operation(names=["delay"])
+    calls = [
+        (operation, {"delay": "0.1"}),
+        ValueError("Record is not an object"),
+        (operation, {"delay": "0"}),
+        (operation, {"delay": "0.05"}),
+    ]
+    failed = asyncio.run(openapi_cli.run_batch(profile, calls, order=order))
+
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert failed == 1
+    assert [record["index"] for record in records] == indexes
+    for record in records:
+        if record["index"] == 1:
+            assert record == {"index": 1, "error": "Record is not an object"}
+        else:
+            # The response belongs to the call at that index, not the one
+            # execute_all() numbered so
+            delay = calls[record["index"]][1]["delay"]
+            assert record["response"]["url"] == f"http://api.test/books/?delay={delay}"
+
+
+def test_execute_all_takes_calls_as_capacity_frees_up(
+    openapi_cli, profile, answer_after_delay, make_operation
+):
+    operation = make_operation(names=["delay"])
+    taken = []
+    done = []
+
+    def calls():
+        for delay in ["0.02", "0", "0.01", "0", "0.03", "0"]:
+            # Taken but not yet done, i.e. calls execute_all() holds
+            taken.append(len(taken) - len(done))
+            yield operation, {"delay": delay}
+
+    async def run():
+        async with openapi_cli.Executor(profile, concurrency=2) as executor:
+            async for index, response in executor.execute_all(calls()):
+                done.append(index)
+
+    asyncio.run(run())
+    assert sorted(done) == list(range(6))
+    assert max(taken) == 1
+
+
+def test_execute_all_cancels_running_calls_when_stopped_early(
+    openapi_cli, profile, answer_after_delay, make_operation
+):
+    operation = make_operation(names=["delay"])
+    calls = [(operation, {"delay": delay}) for delay in ["0", "10", "10"]]
+
+    async def run():
+        async with openapi_cli.Executor(profile) as executor:
+            results = executor.execute_all(calls)
+            index, response = await results.__anext__()
+            await results.aclose()
+            # Let the cancellations reach the requests, before asyncio.run()
+            # cancels whatever is left on its own
+            await asyncio.sleep(0.01)
+            assert index == 0
+            assert answer_after_delay["cancelled"] == 2
+            assert answer_after_delay["in_flight"] == 0
+
+    asyncio.run(run())
@@ -0,0 +1,13 @@
+def test_profiles_with_colliding_slugs_get_own_cache_dirs(openapi_cli):
+    source = "http://localhost:8000"
+    cache_dirs = {
+        openapi_cli.get_cache_dir({"name": name}, source) for name in ("a.b", "a-b", "a_b")
+    }
+    assert len(cache_dirs) == 3
+
+
+def test_sources_get_own_cache_dirs(openapi_cli):
+    profile = {"name": "default"}
+    assert openapi_cli.get_cache_dir(profile, "http://a/b") != openapi_cli.get_cache_dir(
+        profile, "http://a-b"
+    )
@@ -0,0 +1,18 @@
+def test_index_matches_the_options_of_operation_commands(openapi_cli, make_operation):
+    operations = {
+        path: make_operation(path=path, names=names)
+        for path, names in [("/books/", ["q"]), ("/", []), ("/each/", ["each"])]
+    }
+    group = openapi_cli.create_group("get", "", operations, openapi_cli.DEFAULT_PROFILE)
+    groups = {}
+    openapi_cli.build_completion_index(group, groups, "get")
+
+    for path, indexed in groups["get"].items():
+        command = openapi_cli.create_command(operations[path], openapi_cli.DEFAULT_PROFILE)
+        options = {
+            opt
+            for param in command.get_params(openapi_cli.click.Context(command))
+            for opt in param.opts
+        }
+        assert set(indexed["options"]) == options
+    assert "--each" in groups["get"]["/books/"]["options"]
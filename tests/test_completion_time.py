@@ -0,0 +1,97 @@
+"""Completions answered from the index must not import click or the rest.
+
+Runs `python -X importtime openapi-cli.py` as the shell does on every key
+press, once the index is built, and checks what it imported and how long
+that took.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "openapi-cli.py")
+FORBIDDEN_MODULES = ["click", "inspect", "csv", "threading", "httpx"]
+# Imports of the script itself, not counting interpreter startup
+IMPORT_BUDGET_MS = 30
+
+SPEC = {
+    "openapi": "3.0.2",
+    "info": {"title": "Bookstore", "version": "0.0.1"},
+    "paths": {
+        "/book/{name}": {
+            "get": {
+                "summary": "Get Book",
+                "parameters": [
+                    {"name": "name", "in": "path", "required": True, "schema": {"type": "string"}}
+                ],
+            }
+        }
+    },
+}
+
+
+def complete(spec_path, cache_dir, words, cword):
+    """Return the completions and the time in milliseconds each module imported by the script took."""
+    env = dict(
+        os.environ,
+        OPENAPI_CLI_CACHE_DIR=cache_dir,
+        OPENAPI_CLI_CONFIG=os.path.join(cache_dir, "profiles.json"),
+        OPENAPI_CLI_SPEC=spec_path,
+        _OPENAPI_CLI_COMPLETE="bash_complete",
+        COMP_WORDS=words,
+        COMP_CWORD=str(cword),
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", SCRIPT_PATH],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    times = {}
+    started = False
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        # Everything up to and including site is interpreter startup
+        if started:
+            times[name.strip()] = int(self_us) / 1000
+        elif name.strip() == "site":
+            started = True
+    return result.stdout.splitlines(), times
+
+
+@pytest.fixture
+def spec_path(tmp_path):
+    path = tmp_path / "openapi.json"
+    path.write_text(json.dumps(SPEC))
+    return str(path)
+
+
+@pytest.fixture
+def cache_dir(spec_path, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    # The first completion builds the index through click
+    complete(spec_path, cache_dir, "openapi-cli get", 2)
+    return cache_dir
+
+
+def test_completion_from_index_skips_click(spec_path, cache_dir):
+    completions, times = complete(spec_path, cache_dir, "openapi-cli get /book/{name} --", 3)
+
+    assert "plain,--name" in completions
+    imported = [module for module in FORBIDDEN_MODULES if module in times]
+    assert imported == []
+
+
+def test_completion_import_time_budget(spec_path, cache_dir):
+    # The best of a few runs, to not fail on a noisy machine
+    total = min(
+        sum(complete(spec_path, cache_dir, "openapi-cli get", 2)[1].values()) for _ in range(5)
+    )
+    assert total < IMPORT_BUDGET_MS
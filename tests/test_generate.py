@@ -0,0 +1,47 @@
+import pytest
+
+
+SPEC = {
+    "openapi": "3.0.2",
+    "info": {"title": "Shadows", "version": "1"},
+    "paths": {
+        "/x/{send}": {
+            "get": {
+                "summary": "Parameters named like module globals",
+                "parameters": [
+                    {"name": name, "in": location, "required": False, "schema": {"type": "string"}}
+                    for name, location in [
+                        ("send", "path"),
+                        ("sys", "query"),
+                        ("main", "query"),
+                        ("BASE_URL", "query"),
+                        ("class", "query"),
+                    ]
+                ],
+            }
+        }
+    },
+}
+
+
+@pytest.fixture
+def generated(openapi_cli):
+    plan = openapi_cli.compile_spec(SPEC)
+    source = openapi_cli.generate_module(plan, openapi_cli.DEFAULT_PROFILE)
+    namespace = {"__name__": "generated"}
+    exec(compile(source, "generated.py", "exec"), namespace)
+    return namespace
+
+
+def test_parameters_do_not_shadow_module_globals(generated):
+    sent = []
+    generated["send"] = lambda *args: sent.append(args)
+    function, options, identifiers = generated["OPERATIONS"][("get", "/x/{send}")]
+
+    assert not set(identifiers.values()) & {"send", "sys", "main", "BASE_URL", "class"}
+    values = dict.fromkeys(["send", "sys", "main", "BASE_URL", "class"], "v")
+    generated["main"](["get", "/x/{send}"] + [f"--{name}={value}" for name, value in values.items()])
+
+    path_params = {"send": "v"}
+    params = {name: "v" for name in ["sys", "main", "BASE_URL", "class"]}
+    assert sent == [("get", "/x/{send}", path_params, params)]
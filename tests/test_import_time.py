@@ -0,0 +1,87 @@
+"""Commands that never send a request must not import the HTTP stack.
+
+Runs `python -X importtime openapi-cli.py --spec SPEC meta version` in a
+fresh interpreter and checks what it imported, and how long that took.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "openapi-cli.py")
+FORBIDDEN_MODULES = ["httpx", "httpcore", "h11", "ssl"]
+# Imports of the script itself, not counting interpreter startup
+IMPORT_BUDGET_MS = 100
+
+SPEC = {
+    "openapi": "3.0.2",
+    "info": {"title": "Bookstore", "version": "0.0.1"},
+    "paths": {
+        "/book/{name}": {
+            "get": {
+                "summary": "Get Book",
+                "parameters": [
+                    {"name": "name", "in": "path", "required": True, "schema": {"type": "string"}}
+                ],
+            }
+        }
+    },
+}
+
+
+def import_times(spec_path, cache_dir):
+    """Return the time in milliseconds each module imported by the script took."""
+    env = dict(
+        os.environ,
+        OPENAPI_CLI_CACHE_DIR=cache_dir,
+        OPENAPI_CLI_CONFIG=os.path.join(cache_dir, "profiles.json"),
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", SCRIPT_PATH, "--spec", spec_path, "meta", "version"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    times = {}
+    started = False
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        # Everything up to and including site is interpreter startup
+        if started:
+            times[name.strip()] = int(self_us) / 1000
+        elif name.strip() == "site":
+            started = True
+    return times
+
+
+@pytest.fixture
+def spec_path(tmp_path):
+    path = tmp_path / "openapi.json"
+    path.write_text(json.dumps(SPEC))
+    return str(path)
+
+
+@pytest.mark.parametrize("run", ["compile", "snapshot"])
+def test_meta_version_skips_http_stack(spec_path, tmp_path, run):
+    cache_dir = str(tmp_path / "cache")
+    if run == "snapshot":
+        import_times(spec_path, cache_dir)
+    times = import_times(spec_path, cache_dir)
+
+    imported = [module for module in FORBIDDEN_MODULES if module in times]
+    assert imported == []
+
+
+def test_import_time_budget(spec_path, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    import_times(spec_path, cache_dir)
+    # The best of a few runs, to not fail on a noisy machine
+    total = min(sum(import_times(spec_path, cache_dir).values()) for _ in range(3))
+    assert total < IMPORT_BUDGET_MS
@@ -0,0 +1,58 @@
+import json
+
+from click.testing import CliRunner
+
+
+SPEC = {
+    "openapi": "3.0.2",
+    "info": {"title": "Pets", "version": "1"},
+    "paths": {
+        "/pet/{petId}": {
+            "get": {
+                "summary": "Parameter names click would rewrite",
+                "parameters": [
+                    {"name": "petId", "in": "path", "required": True, "schema": {"type": "integer"}},
+                    {"name": "X-Trace", "in": "query", "required": False, "schema": {"type": "string"}},
+                ],
+            }
+        }
+    },
+}
+
+
+def test_each_passes_parameters_by_their_spec_names(openapi_cli, isolated_cache, sent_urls):
+    spec_path = isolated_cache / "pets.json"
+    spec_path.write_text(json.dumps(SPEC))
+    main = openapi_cli.create_cli(spec=str(spec_path))
+
+    result = CliRunner().invoke(
+        main, ["get", "/pet/{petId}", "--each", "petId=-", "--X-Trace", "abc"], input="1\n2\n"
+    )
+    assert result.exit_code == 0, result.output
+    records = [json.loads(line) for line in result.output.splitlines()]
+    assert [record["value"] for record in records] == ["1", "2"]
+    assert all(record["status"] == 200 for record in records)
+    base_url = openapi_cli.DEFAULT_PROFILE["base_url"]
+    assert sorted(sent_urls) == [
+        f"{base_url}/pet/1?X-Trace=abc",
+        f"{base_url}/pet/2?X-Trace=abc",
+    ]
+
+
+def test_dispatch_and_click_send_the_same_request(openapi_cli, isolated_cache, sent_urls, capsys):
+    spec_path = isolated_cache / "pets.json"
+    spec_path.write_text(json.dumps(SPEC))
+    args = ["get", "/pet/{petId}", "--petId", "7", "--X-Trace", "abc"]
+    profile = openapi_cli.load_profile()
+    located = openapi_cli.locate_spec(str(spec_path), profile)
+
+    # The first run goes through click, which also compiles the plan
+    assert not openapi_cli.dispatch_operation(args, profile, located)
+    main = openapi_cli.create_cli(spec=str(spec_path), located=located)
+    main(args, standalone_mode=False)
+    assert openapi_cli.dispatch_operation(args, profile, located)
+
+    base_url = openapi_cli.DEFAULT_PROFILE["base_url"]
+    assert sent_urls == [f"{base_url}/pet/7?X-Trace=abc"] * 2
+    output = capsys.readouterr().out.splitlines()
+    assert [json.loads(line) for line in output] == [{"url": sent_urls[0]}] * 2
@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+
+def acquire_times(bucket, count, idle=0):
+    """Return how many seconds after the first each of `count` concurrent
+    acquisitions of the bucket got through, after it was left idle for `idle`
+    seconds."""
+    async def run():
+        await asyncio.sleep(idle)
+        started = time.monotonic()
+
+        async def acquire():
+            await bucket.acquire()
+            return time.monotonic() - started
+
+        return await asyncio.gather(*(acquire() for _ in range(count)))
+
+    return asyncio.run(run())
+
+
+def test_acquisitions_are_paced_at_the_rate(openapi_cli):
+    times = acquire_times(openapi_cli.TokenBucket(rate=50, burst=1), 6)
+
+    assert times == sorted(times)
+    assert times[0] < 0.01
+    # One token every 20ms after the first, with some slack for the scheduler
+    for earlier, later in zip(times, times[1:]):
+        assert later - earlier > 0.015
+    assert times[-1] < 0.2
+
+
+def test_burst_goes_through_at_once(openapi_cli):
+    times = acquire_times(openapi_cli.TokenBucket(rate=10, burst=3), 4)
+
+    assert max(times[:3]) < 0.01
+    # The bucket is empty after the burst, and refills at 10 tokens per second
+    assert 0.09 < times[3] < 0.2
+
+
+def test_idle_bucket_refills_up_to_the_burst(openapi_cli):
+    # Enough time for 10 tokens, of which the bucket holds on to 3
+    times = acquire_times(openapi_cli.TokenBucket(rate=20, burst=3), 4, idle=0.5)
+
+    assert max(times[:3]) < 0.01
+    assert 0.04 < times[3] < 0.15
@@ -0,0 +1,53 @@
+import httpx
+import pytest
+
+
+def make_policy(openapi_cli, **settings):
+    profile = dict(openapi_cli.DEFAULT_PROFILE, name="test", **settings)
+    policy = openapi_cli.RetryPolicy(profile)
+    policy.requests += 1
+    return policy
+
+
+def test_retry_after_is_waited_for(openapi_cli, make_operation):
+    policy = make_policy(openapi_cli)
+    response = httpx.Response(429, headers={"Retry-After": "2"})
+    assert policy.delay(make_operation(), 1, response) == 2.0
+
+
+def test_retry_after_above_backoff_max_gives_up(openapi_cli, make_operation):
+    policy = make_policy(openapi_cli, retry_backoff_max=5.0)
+    response = httpx.Response(503, headers={"Retry-After": "3600"})
+    assert policy.delay(make_operation(), 1, response) is None
+    # Giving up does not use up the retry budget
+    assert policy.retries == 0
+
+
+def test_backoff_is_capped(openapi_cli, make_operation):
+    policy = make_policy(openapi_cli, retry_backoff=10.0, retry_backoff_max=1.0)
+    delay = policy.delay(make_operation(), 3, httpx.Response(502))
+    assert 0 <= delay <= 1.0
+
+
+def test_non_retry_method_and_status_are_not_retried(openapi_cli, make_operation):
+    policy = make_policy(openapi_cli)
+    assert policy.delay(make_operation("post"), 1, httpx.Response(503)) is None
+    assert policy.delay(make_operation(), 1, httpx.Response(500)) is None
+
+
+def test_transport_error_after_last_attempt_names_url_and_attempts(openapi_cli, monkeypatch, make_operation):
+    def handler(request):
+        raise httpx.ConnectError("Connection refused", request=request)
+
+    monkeypatch.setattr(
+        openapi_cli,
+        "make_client",
+        lambda profile, asynchronous=False: httpx.Client(transport=httpx.MockTransport(handler)),
+    )
+    monkeypatch.setattr(openapi_cli, "CLIENTS", {})
+    profile = dict(openapi_cli.DEFAULT_PROFILE, name="test", base_url="http://api.test", retry_backoff=0)
+    with pytest.raises(openapi_cli.click.ClickException) as excinfo:
+        openapi_cli.send_operation(make_operation(), profile, {})
+    assert excinfo.value.message == (
+        "GET http://api.test/books/ failed after 4 attempts: Connection refused"
+    )
@@ -0,0 +1,81 @@
+"""The lazy spec loader must compile specs exactly like json.loads() does."""
+import json
+
+import pytest
+
+
+def compile_both(openapi_cli, text):
+    lazy = openapi_cli.compile_spec(openapi_cli.parse_spec(text.encode()))
+    eager = openapi_cli.compile_spec(json.loads(text))
+    return lazy, eager
+
+
+def assert_same_plan(lazy, eager):
+    # Only the hashes differ, as they are taken over the text or a re-dump of it
+    for key in ("version", "recompiled", "openapi", "info", "tags"):
+        assert lazy[key] == eager[key]
+    assert [operation.to_row() for operation in lazy["operations"]] == [
+        operation.to_row() for operation in eager["operations"]
+    ]
+    assert lazy["hashes"]["paths"].keys() == eager["hashes"]["paths"].keys()
+
+
+SPECS = {
+    "escaped braces and quotes": r'''{
+        "openapi": "3.0.2",
+        "info": {"title": "Braces {\"}\" and \\\"quotes\\\"", "version": "1",
+                 "description": "}{ } \\ \" ]["},
+        "paths": {
+            "/a/{id}": {"get": {"summary": "Get \"}\" or '{'", "description": "} , :",
+                "parameters": [{"name": "id", "in": "path", "description": "{\"x\": 1}",
+                                "schema": {"type": "integer"}}]}},
+            "/b\"}": {"post": {"summary": "}}}", "parameters": []}}
+        }
+    }''',
+    "whitespace around separators": '''
+        {
+          "openapi"   :   "3.0.2" ,
+          "info" :{"title":"T" ,"version"	:	"1"}
+          ,"paths"
+          :
+          {  "/a" : { "get" : { "summary" : "A" , "parameters" : [ ] } } ,
+             "/b":{"get":{"summary":"B"}}  }
+          , "tags" : [ { "name" : "t" , "description" : "d" } ]
+        }
+    ''',
+    "empty objects": '''{
+        "openapi": "3.0.2",
+        "info": {"title": "T", "version": "1"},
+        "paths": {"/a": {}, "/b": {"get": {"summary": "B", "responses": {}}}, "/c": {}},
+        "components": {}
+    }''',
+    "no paths": '{"openapi": "3.0.2", "info": {"title": "T", "version": "1"}, "paths": {}}',
+    "refs into components": '''{
+        "openapi": "3.0.2",
+        "info": {"title": "T", "version": "1"},
+        "paths": {"/a/{id}": {"parameters": [{"$ref": "#/components/parameters/Id"}],
+                              "get": {"summary": "A"}}},
+        "components": {"parameters": {"Id": {"name": "id", "in": "path",
+                                             "schema": {"type": "string", "default": "{}"}}}}
+    }''',
+}
+
+
+@pytest.mark.parametrize("text", SPECS.values(), ids=SPECS.keys())
+def test_lazy_and_json_loaders_agree(openapi_cli, text):
+    assert_same_plan(*compile_both(openapi_cli, text))
+
+
+MALFORMED = {
+    "missing colon in paths": '{"openapi": "3.0.2", "info": {"title": "T", "version": "1"}, '
+    '"paths": {"/a" {"get": {"summary": "A"}}}}',
+    "number as a key": '{"openapi": "3.0.2", "info": {"title": "T", "version": "1"}, '
+    '"paths": {1: {}}}',
+    "not an object": '["openapi"]',
+}
+
+
+@pytest.mark.parametrize("text", MALFORMED.values(), ids=MALFORMED.keys())
+def test_malformed_specs_are_rejected(openapi_cli, text):
+    with pytest.raises(ValueError):
+        openapi_cli.compile_spec(openapi_cli.parse_spec(text.encode()))
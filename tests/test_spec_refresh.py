@@ -0,0 +1,42 @@
+import json
+import os
+import time
+
+import httpx
+import pytest
+
+
+def test_only_one_background_refresh_at_a_time(openapi_cli, isolated_cache, monkeypatch):
+    profile = openapi_cli.load_profile()
+    cache_dir = openapi_cli.get_cache_dir(profile, profile["base_url"])
+    os.makedirs(cache_dir)
+    with open(os.path.join(cache_dir, "openapi.json"), "w") as f:
+        f.write("{}")
+    # Older than the refresh interval, but younger than the TTL
+    fetched_at = time.time() - profile["spec_refresh_interval"] - 1
+    with open(os.path.join(cache_dir, "metadata.json"), "w") as f:
+        json.dump({"digest": "abc", "fetched_at": fetched_at}, f)
+
+    refreshes = []
+    monkeypatch.setattr("subprocess.Popen", lambda *args, **kwargs: refreshes.append(args))
+    for _ in range(3):
+        assert openapi_cli.fetch_spec(profile)[0] == "abc"
+    assert len(refreshes) == 1
+
+
+def test_failed_spec_fetch_is_reported_without_traceback(openapi_cli, isolated_cache, monkeypatch):
+    def handler(request):
+        raise httpx.RemoteProtocolError("Server disconnected", request=request)
+
+    monkeypatch.setattr(
+        openapi_cli,
+        "make_client",
+        lambda profile, asynchronous=False: httpx.Client(transport=httpx.MockTransport(handler)),
+    )
+    monkeypatch.setattr(openapi_cli, "CLIENTS", {})
+    profile = dict(openapi_cli.load_profile(), base_url="http://api.test")
+    with pytest.raises(openapi_cli.click.ClickException) as excinfo:
+        openapi_cli.fetch_spec(profile)
+    assert excinfo.value.message == (
+        "Cannot fetch the spec from http://api.test/openapi.json: Server disconnected"
+    )